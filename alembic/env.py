@@ -7,13 +7,11 @@ from alembic import context
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
-from app.config import settings
+from app.database import database_url
 from app.models import Base
 
 config = context.config
-config.set_main_option(
-    "sqlalchemy.url", f"postgresql+psycopg2://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}"
-                      f"@{settings.POSTGRES_HOSTNAME}:{settings.DATABASE_PORT}/{settings.POSTGRES_DB}")
+config.set_main_option("sqlalchemy.url", database_url("postgresql+psycopg2"))
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
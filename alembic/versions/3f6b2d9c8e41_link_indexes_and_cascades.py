@@ -0,0 +1,56 @@
+"""Link indexes and cascades
+
+Revision ID: 3f6b2d9c8e41
+Revises: afd1808be6a6
+Create Date: 2026-10-18 14:02:37.481920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b2d9c8e41'
+down_revision = 'afd1808be6a6'
+branch_labels = None
+depends_on = None
+
+FOREIGN_KEYS = [
+    ('users_skills', 'skill_id', 'skills'),
+    ('users_skills', 'user_id', 'users'),
+    ('vacancies_skills', 'skill_id', 'skills'),
+    ('vacancies_skills', 'vacancy_id', 'vacancies'),
+]
+
+
+def replace_foreign_keys(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=ondelete)
+
+
+def check_case_insensitive_emails():
+    conflicts = op.get_bind().execute(sa.text(
+        "SELECT string_agg(email, ', ' ORDER BY email) FROM users GROUP BY lower(email) HAVING count(*) > 1"
+    )).scalars().all()
+    if conflicts:
+        raise RuntimeError('users.email must be unique ignoring case before upgrading; merge or rename these '
+                           'accounts first:\n' + '\n'.join(conflicts))
+
+
+def upgrade():
+    check_case_insensitive_emails()
+    op.create_index('ix_users_skills_user_id', 'users_skills', ['user_id', 'skill_id', 'years'])
+    op.create_index('ix_vacancies_skills_vacancy_id', 'vacancies_skills', ['vacancy_id', 'skill_id', 'years'])
+    op.create_index('ux_users_email_lower', 'users', [sa.text('lower(email)')], unique=True)
+    op.drop_constraint('users_email_key', 'users', type_='unique')
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
+    op.create_unique_constraint('users_email_key', 'users', ['email'])
+    op.drop_index('ux_users_email_lower', table_name='users')
+    op.drop_index('ix_vacancies_skills_vacancy_id', table_name='vacancies_skills')
+    op.drop_index('ix_users_skills_user_id', table_name='users_skills')
@@ -0,0 +1,39 @@
+"""Currency rates and salary_usd
+
+Revision ID: 5d4a9e3f7c12
+Revises: 8c1e5a7d2b90
+Create Date: 2026-10-18 16:58:14.220871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d4a9e3f7c12'
+down_revision = '8c1e5a7d2b90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('currency_rates',
+    sa.Column('currency', sa.String(), nullable=False),
+    sa.Column('usd_rate', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('currency')
+    )
+    op.execute("INSERT INTO currency_rates (currency, usd_rate) VALUES ('USD', 1.0)")
+
+    op.add_column('vacancies', sa.Column('salary_usd', sa.Float(), nullable=True))
+    op.execute("UPDATE vacancies SET salary_usd = vacancies.salary * currency_rates.usd_rate "
+               "FROM currency_rates WHERE currency_rates.currency = upper(vacancies.currency)")
+    op.create_index('ix_vacancies_salary_usd', 'vacancies', ['salary_usd'])
+    op.create_index('ix_vacancies_currency_salary_usd', 'vacancies', [sa.text('upper(currency)'), 'salary_usd'])
+
+
+def downgrade():
+    op.drop_index('ix_vacancies_currency_salary_usd', table_name='vacancies')
+    op.drop_index('ix_vacancies_salary_usd', table_name='vacancies')
+    op.drop_column('vacancies', 'salary_usd')
+    op.drop_table('currency_rates')
@@ -0,0 +1,57 @@
+"""Change feed triggers
+
+Revision ID: 8c1e5a7d2b90
+Revises: 3f6b2d9c8e41
+Create Date: 2026-10-18 16:10:52.903114
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1e5a7d2b90'
+down_revision = '3f6b2d9c8e41'
+branch_labels = None
+depends_on = None
+
+COLUMNS = {
+    'skills': ('id', 'name'),
+    'users': ('id',),
+    'users_skills': ('user_id', 'skill_id', 'years'),
+    'vacancies': ('id',),
+    'vacancies_skills': ('vacancy_id', 'skill_id', 'years'),
+}
+
+
+def upgrade():
+    op.execute("""
+    CREATE OR REPLACE FUNCTION notify_change() RETURNS trigger AS $$
+    DECLARE
+        changed jsonb;
+        keys jsonb := '{}'::jsonb;
+        column_name text;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            changed := to_jsonb(OLD);
+        ELSE
+            changed := to_jsonb(NEW);
+        END IF;
+        FOREACH column_name IN ARRAY TG_ARGV LOOP
+            keys := keys || jsonb_build_object(column_name, changed -> column_name);
+        END LOOP;
+        PERFORM pg_notify('hunty_changes',
+                          jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'row', keys)::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """)
+    for table, columns in COLUMNS.items():
+        arguments = ', '.join(f"'{column}'" for column in columns)
+        op.execute(f'CREATE TRIGGER {table}_change_feed AFTER INSERT OR UPDATE OR DELETE ON {table} '
+                   f'FOR EACH ROW EXECUTE PROCEDURE notify_change({arguments})')
+
+
+def downgrade():
+    for table in COLUMNS:
+        op.execute(f'DROP TRIGGER {table}_change_feed ON {table}')
+    op.execute('DROP FUNCTION notify_change()')
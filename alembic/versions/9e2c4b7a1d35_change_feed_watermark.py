@@ -0,0 +1,47 @@
+"""Change feed watermark
+
+Revision ID: 9e2c4b7a1d35
+Revises: 5d4a9e3f7c12
+Create Date: 2026-10-18 18:20:44.516032
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9e2c4b7a1d35'
+down_revision = '5d4a9e3f7c12'
+branch_labels = None
+depends_on = None
+
+NOTIFY_CHANGE_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_change() RETURNS trigger AS $$
+DECLARE
+    changed jsonb;
+    keys jsonb := '{{}}'::jsonb;
+    column_name text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := to_jsonb(OLD);
+    ELSE
+        changed := to_jsonb(NEW);
+    END IF;
+    FOREACH column_name IN ARRAY TG_ARGV LOOP
+        keys := keys || jsonb_build_object(column_name, changed -> column_name);
+    END LOOP;{bump}
+    PERFORM pg_notify('hunty_changes',
+                      jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'row', keys)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade():
+    op.execute('CREATE SEQUENCE change_feed_seq')
+    op.execute(NOTIFY_CHANGE_FUNCTION.format(bump="\n    PERFORM nextval('change_feed_seq');"))
+
+
+def downgrade():
+    op.execute(NOTIFY_CHANGE_FUNCTION.format(bump=''))
+    op.execute('DROP SEQUENCE change_feed_seq')
@@ -0,0 +1,25 @@
+"""Skills updated_at
+
+Revision ID: afd1808be6a6
+Revises: fb307993e010
+Create Date: 2026-10-18 11:48:05.127694
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'afd1808be6a6'
+down_revision = 'fb307993e010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('skills', sa.Column('updated_at', sa.TIMESTAMP(timezone=True),
+                                      server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade():
+    op.drop_column('skills', 'updated_at')
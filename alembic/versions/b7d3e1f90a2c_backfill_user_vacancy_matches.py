@@ -0,0 +1,37 @@
+"""Backfill user vacancy matches
+
+Revision ID: b7d3e1f90a2c
+Revises: 9e2c4b7a1d35
+Create Date: 2026-10-18 18:52:09.731845
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3e1f90a2c'
+down_revision = '9e2c4b7a1d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same rule as app.recommender.all_matches: every required year met on at
+    # least half of the vacancy's skills.
+    op.execute('DELETE FROM user_vacancy_matches')
+    op.execute("""
+    INSERT INTO user_vacancy_matches (user_id, vacancy_id, matched, required, score)
+    SELECT users_skills.user_id, vacancies_skills.vacancy_id, count(*), required.required,
+           CAST(count(*) AS FLOAT) * 100 / required.required
+    FROM users_skills
+    JOIN vacancies_skills ON vacancies_skills.skill_id = users_skills.skill_id
+                         AND users_skills.years >= vacancies_skills.years
+    JOIN (SELECT vacancy_id, count(*) AS required FROM vacancies_skills GROUP BY vacancy_id) AS required
+      ON required.vacancy_id = vacancies_skills.vacancy_id
+    GROUP BY users_skills.user_id, vacancies_skills.vacancy_id, required.required
+    HAVING count(*) * 100 >= required.required * 50
+    """)
+
+
+def downgrade():
+    pass
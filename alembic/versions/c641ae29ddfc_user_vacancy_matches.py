@@ -0,0 +1,38 @@
+"""User vacancy matches
+
+Revision ID: c641ae29ddfc
+Revises: bdef5f4c9252
+Create Date: 2026-10-18 10:12:41.318402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c641ae29ddfc'
+down_revision = 'bdef5f4c9252'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_vacancy_matches',
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('vacancy_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('matched', sa.Integer(), nullable=False),
+    sa.Column('required', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['vacancy_id'], ['vacancies.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'vacancy_id')
+    )
+    op.create_index('ix_user_vacancy_matches_user_score', 'user_vacancy_matches',
+                    ['user_id', sa.text('score DESC'), 'vacancy_id'])
+    op.create_index('ix_user_vacancy_matches_vacancy_id', 'user_vacancy_matches', ['vacancy_id'])
+
+
+def downgrade():
+    op.drop_index('ix_user_vacancy_matches_vacancy_id', table_name='user_vacancy_matches')
+    op.drop_index('ix_user_vacancy_matches_user_score', table_name='user_vacancy_matches')
+    op.drop_table('user_vacancy_matches')
@@ -0,0 +1,102 @@
+"""Statement-level change feed triggers
+
+Revision ID: d5a8c2e64f17
+Revises: b7d3e1f90a2c
+Create Date: 2026-10-18 19:31:26.408157
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a8c2e64f17'
+down_revision = 'b7d3e1f90a2c'
+branch_labels = None
+depends_on = None
+
+COLUMNS = {
+    'skills': ('id', 'name'),
+    'users': ('id',),
+    'users_skills': ('user_id', 'skill_id', 'years'),
+    'vacancies': ('id',),
+    'vacancies_skills': ('vacancy_id', 'skill_id', 'years'),
+}
+EVENTS = (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD'))
+
+# Statements over 100 rows (BULK_ROWS in app/change_feed.py) notify once with a null row.
+STATEMENT_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_change() RETURNS trigger AS $$
+DECLARE
+    changed jsonb;
+    keys jsonb;
+    column_name text;
+BEGIN
+    IF NOT EXISTS (SELECT FROM changed_rows) THEN
+        RETURN NULL;
+    END IF;
+    PERFORM nextval('change_feed_seq');
+    IF (SELECT count(*) FROM (SELECT FROM changed_rows LIMIT 101) AS bounded) > 100 THEN
+        PERFORM pg_notify('hunty_changes',
+                          jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'row', NULL)::text);
+        RETURN NULL;
+    END IF;
+    FOR changed IN SELECT to_jsonb(changed_rows) FROM changed_rows LOOP
+        keys := '{}'::jsonb;
+        FOREACH column_name IN ARRAY TG_ARGV LOOP
+            keys := keys || jsonb_build_object(column_name, changed -> column_name);
+        END LOOP;
+        PERFORM pg_notify('hunty_changes',
+                          jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'row', keys)::text);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+ROW_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_change() RETURNS trigger AS $$
+DECLARE
+    changed jsonb;
+    keys jsonb := '{}'::jsonb;
+    column_name text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := to_jsonb(OLD);
+    ELSE
+        changed := to_jsonb(NEW);
+    END IF;
+    FOREACH column_name IN ARRAY TG_ARGV LOOP
+        keys := keys || jsonb_build_object(column_name, changed -> column_name);
+    END LOOP;
+    PERFORM nextval('change_feed_seq');
+    PERFORM pg_notify('hunty_changes',
+                      jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'row', keys)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def arguments(table):
+    return ', '.join(f"'{column}'" for column in COLUMNS[table])
+
+
+def upgrade():
+    for table in COLUMNS:
+        op.execute(f'DROP TRIGGER {table}_change_feed ON {table}')
+    op.execute(STATEMENT_FUNCTION)
+    for table in COLUMNS:
+        for event, transition in EVENTS:
+            op.execute(f'CREATE TRIGGER {table}_change_feed_{event.lower()} AFTER {event} ON {table} '
+                       f'REFERENCING {transition} TABLE AS changed_rows '
+                       f'FOR EACH STATEMENT EXECUTE PROCEDURE notify_change({arguments(table)})')
+
+
+def downgrade():
+    for table in COLUMNS:
+        for event, _ in EVENTS:
+            op.execute(f'DROP TRIGGER {table}_change_feed_{event.lower()} ON {table}')
+    op.execute(ROW_FUNCTION)
+    for table in COLUMNS:
+        op.execute(f'CREATE TRIGGER {table}_change_feed AFTER INSERT OR UPDATE OR DELETE ON {table} '
+                   f'FOR EACH ROW EXECUTE PROCEDURE notify_change({arguments(table)})')
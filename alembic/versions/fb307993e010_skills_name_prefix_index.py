@@ -0,0 +1,24 @@
+"""Skills name prefix index
+
+Revision ID: fb307993e010
+Revises: c641ae29ddfc
+Create Date: 2026-10-18 11:02:17.804113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fb307993e010'
+down_revision = 'c641ae29ddfc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_skills_name_prefix', 'skills', [sa.text('lower(name) text_pattern_ops')])
+
+
+def downgrade():
+    op.drop_index('ix_skills_name_prefix', table_name='skills')
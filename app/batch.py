@@ -0,0 +1,125 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .recommender import MATCH_THRESHOLD
+
+MAX_CELLS = 1 << 22
+
+
+class SkillMatrices:
+    def __init__(self, vacancy_rows, user_rows):
+        vacancy_rows = sorted(vacancy_rows, key=lambda row: (row[0], row[1]))
+        self.vacancy_ids = sorted({vacancy_id for _, vacancy_id, _ in vacancy_rows})
+        vacancy_position = {vacancy_id: idx for idx, vacancy_id in enumerate(self.vacancy_ids)}
+        self.skill_ids = sorted({skill_id for skill_id, _, _ in vacancy_rows})
+        skill_position = {skill_id: idx for idx, skill_id in enumerate(self.skill_ids)}
+
+        posting_skills = np.fromiter((skill_position[row[0]] for row in vacancy_rows), dtype=np.int32,
+                                     count=len(vacancy_rows))
+        self.posting_vacancies = np.fromiter((vacancy_position[row[1]] for row in vacancy_rows), dtype=np.int32,
+                                             count=len(vacancy_rows))
+        self.posting_years = np.fromiter((row[2] for row in vacancy_rows), dtype=np.int32,
+                                         count=len(vacancy_rows))
+        self.skill_offsets = np.searchsorted(posting_skills, np.arange(len(self.skill_ids) + 1)).astype(np.int64)
+        self.required = np.bincount(self.posting_vacancies, minlength=len(self.vacancy_ids))
+
+        user_rows = sorted((row for row in user_rows if row[1] in skill_position), key=lambda row: row[0])
+        self.user_ids = []
+        user_counts = []
+        for user_id, _, _ in user_rows:
+            if not self.user_ids or self.user_ids[-1] != user_id:
+                self.user_ids.append(user_id)
+                user_counts.append(0)
+            user_counts[-1] += 1
+        self.user_offsets = np.concatenate(([0], np.cumsum(user_counts, dtype=np.int64)))
+        self.user_skills = np.fromiter((skill_position[row[1]] for row in user_rows), dtype=np.int32,
+                                       count=len(user_rows))
+        self.user_years = np.fromiter((row[2] for row in user_rows), dtype=np.int32, count=len(user_rows))
+
+    @classmethod
+    def load(cls, db: Session, user_ids=None):
+        vacancy_rows = db.execute(
+            select(models.VacancySkill.skill_id, models.VacancySkill.vacancy_id, models.VacancySkill.years)
+        ).all()
+        user_query = select(models.UserSkill.user_id, models.UserSkill.skill_id, models.UserSkill.years)
+        if user_ids is not None:
+            user_query = user_query.where(models.UserSkill.user_id.in_(user_ids))
+        return cls(vacancy_rows, db.execute(user_query).all())
+
+    def score_chunk(self, start, end):
+        vacancies_qty = len(self.vacancy_ids)
+        chunk = end - start
+        first, last = self.user_offsets[start], self.user_offsets[end]
+
+        entry_users = np.repeat(np.arange(chunk), np.diff(self.user_offsets[start:end + 1]))
+        entry_skills = self.user_skills[first:last]
+        entry_years = self.user_years[first:last]
+
+        starts = self.skill_offsets[entry_skills]
+        lengths = self.skill_offsets[entry_skills + 1] - starts
+        pair_offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        postings = pair_offsets + np.arange(lengths.sum())
+
+        fits = np.repeat(entry_years, lengths) >= self.posting_years[postings]
+        cells = np.repeat(entry_users, lengths)[fits] * vacancies_qty + self.posting_vacancies[postings][fits]
+        matched = np.bincount(cells, minlength=chunk * vacancies_qty).reshape(chunk, vacancies_qty)
+
+        qualifies = (matched > 0) & (matched * 100 >= self.required * MATCH_THRESHOLD)
+        scores = np.where(qualifies, matched * 100.0 / np.maximum(self.required, 1), 0.0)
+        return qualifies, scores
+
+    def iter_recommendations(self, limit=None, max_cells=MAX_CELLS):
+        chunk_size = max(1, max_cells // max(len(self.vacancy_ids), 1))
+
+        for start in range(0, len(self.user_ids), chunk_size):
+            end = min(start + chunk_size, len(self.user_ids))
+            qualifies, scores = self.score_chunk(start, end)
+
+            for row in range(end - start):
+                matches = np.flatnonzero(qualifies[row])
+                ranked = matches[np.lexsort((matches, -scores[row, matches]))][:limit]
+                yield self.user_ids[start + row], [
+                    (self.vacancy_ids[idx], float(scores[row, idx])) for idx in ranked
+                ]
+
+
+def recommendations_ndjson(matrices: SkillMatrices, limit=None):
+    for user_id, vacancies in matrices.iter_recommendations(limit=limit):
+        yield json.dumps({
+            "user_id": str(user_id),
+            "vacancies": [{"id": str(vacancy_id), "score": score} for vacancy_id, score in vacancies]
+        }) + "\n"
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Write recommendations for many users as NDJSON")
+    parser.add_argument("--user-id", action="append", dest="user_ids", help="restrict to these users")
+    parser.add_argument("--limit", type=int, default=None, help="vacancies per user")
+    parser.add_argument("--output", default="-", help="output file, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        matrices = SkillMatrices.load(db, args.user_ids)
+    finally:
+        db.close()
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for line in recommendations_ndjson(matrices, limit=args.limit):
+            output.write(line)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from . import metrics
+from .change_feed import change_feed
+from .config import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CACHE_REQUESTS = metrics.Counter('cache_requests_total', 'Cache lookups by result', ['backend', 'result'])
+CACHE_EVICTIONS = metrics.Counter('cache_evictions_total', 'Entries evicted for size or age', ['backend'])
+
+
+class Cache:
+    name = None
+    shared = False
+
+    def key(self, namespace, *parts, scope=None):
+        names = [namespace] if scope is None else [namespace, f'{namespace}:{scope}']
+        return ':'.join(str(part) for part in (namespace, *self.generations(names), *parts))
+
+    def generations(self, names):
+        return [self.generation(name) for name in names]
+
+    def get(self, key):
+        value = self._get(key)
+        CACHE_REQUESTS.inc(backend=self.name, result='miss' if value is None else 'hit')
+        return value
+
+    def bump(self, namespace, scope=None):
+        self._incr(namespace if scope is None else f'{namespace}:{scope}')
+
+    def invalidate(self, namespace, *parts, scope=None):
+        self.delete(self.key(namespace, *parts, scope=scope))
+
+
+class MemoryCache(Cache):
+    name = 'memory'
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = OrderedDict()
+        self._generation_floor = 0
+        self._clock = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                CACHE_EVICTIONS.inc(backend=self.name)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.inc(backend=self.name)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def generation(self, namespace):
+        with self._lock:
+            value = self._generations.get(namespace)
+            if value is None:
+                return self._generation_floor
+            self._generations.move_to_end(namespace)
+            return value
+
+    def _incr(self, namespace):
+        # Generations come from one clock, and a namespace whose generation was
+        # evicted reads the highest evicted value. It can never return to a
+        # generation its stale entries were stored under.
+        with self._lock:
+            self._clock += 1
+            self._generations[namespace] = self._clock
+            self._generations.move_to_end(namespace)
+            while len(self._generations) > self.max_entries:
+                _, value = self._generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._generation_floor = 0
+            self._clock = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache(Cache):
+    name = 'redis'
+    shared = True
+
+    def __init__(self, client, ttl=60, prefix='hunty'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _get(self, key):
+        value = self.client.get(f'{self.prefix}:{key}')
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value):
+        self.client.set(f'{self.prefix}:{key}', json.dumps(value), ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(f'{self.prefix}:{key}' for key in keys))
+
+    def generation(self, namespace):
+        return int(self.client.get(f'{self.prefix}:generation:{namespace}') or 0)
+
+    def generations(self, names):
+        return [int(value or 0) for value in self.client.mget([f'{self.prefix}:generation:{name}' for name in names])]
+
+    def _incr(self, namespace):
+        self.client.incr(f'{self.prefix}:generation:{namespace}')
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}:*'):
+            self.client.delete(key)
+
+
+class NullCache(Cache):
+    name = 'none'
+
+    def key(self, namespace, *parts, scope=None):
+        return None
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def bump(self, namespace, scope=None):
+        pass
+
+    def invalidate(self, namespace, *parts, scope=None):
+        pass
+
+    def clear(self):
+        pass
+
+
+def create_cache():
+    if settings.CACHE_BACKEND == 'redis':
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND=redis requires the redis package')
+        return RedisCache(redis.Redis.from_url(settings.CACHE_REDIS_URL), ttl=settings.CACHE_TTL)
+    if settings.CACHE_BACKEND == 'memory':
+        return MemoryCache(max_entries=settings.CACHE_MAX_ENTRIES, ttl=settings.CACHE_TTL)
+    return NullCache()
+
+
+@lru_cache()
+def get_cache():
+    return create_cache()
+
+
+class LazyCache:
+    # Picks the backend from settings on first use instead of at import.
+    def __getattr__(self, name):
+        return getattr(get_cache(), name)
+
+
+cache = LazyCache()
+
+
+BULK_NAMESPACES = {
+    'skills': ('skill', 'user'),
+    'vacancies': ('vacancy', 'recommend'),
+    'vacancies_skills': ('recommend',),
+    'users': ('user', 'recommend'),
+    'users_skills': ('user', 'recommend'),
+}
+
+
+def invalidate_on_change(change):
+    # Writes from other workers, bulk loads or psql land here; entries this
+    # process already invalidated are simply bumped again.
+    if cache.shared:
+        return
+    row = change.row
+    if row is None:
+        for namespace in BULK_NAMESPACES[change.table]:
+            cache.bump(namespace)
+    elif change.table == 'skills':
+        cache.invalidate('skill', row['id'])
+        cache.bump('user')
+    elif change.table == 'vacancies':
+        cache.invalidate('vacancy', row['id'])
+        cache.bump('recommend')
+    elif change.table == 'vacancies_skills':
+        cache.bump('recommend')
+    elif change.table in ('users', 'users_skills'):
+        user_id = row['id'] if change.table == 'users' else row['user_id']
+        cache.invalidate('user', user_id)
+        cache.bump('recommend', scope=user_id)
+
+
+change_feed.subscribe(('skills', 'vacancies', 'vacancies_skills', 'users', 'users_skills'), invalidate_on_change)
+
+
+def clear_on_resync():
+    if not cache.shared:
+        cache.clear()
+
+
+change_feed.on_resync(clear_on_resync)
+
+metrics.Gauge('cache_entries', 'Entries held by the in-process cache', ['backend'],
+              collect=lambda: [({'backend': cache.name}, len(get_cache()))]
+              if isinstance(get_cache(), MemoryCache) else [])
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+from collections import namedtuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Must match the channel used by the notify_change() trigger function.
+CHANNEL = 'hunty_changes'
+
+# How far the change_feed_seq sequence bumped by the same triggers has got.
+WATERMARK_QUERY = 'SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM change_feed_seq'
+# Whether a writer was still in flight when the current snapshot was taken.
+IN_FLIGHT_QUERY = 'SELECT EXISTS (SELECT FROM txid_snapshot_xip(txid_current_snapshot()))'
+
+# The triggers notify once per row for statements up to this size, and once
+# with a null row for larger ones (bulk loads), which handlers treat as
+# "anything in the table may have changed".
+BULK_ROWS = 100
+
+Change = namedtuple('Change', ['table', 'op', 'row'])
+
+
+class ChangeFeed:
+    def __init__(self, channel, reconnect_delay=1.0):
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._subscribers = {}
+        self._resync = []
+        self._task = None
+        self.listening = None
+        # Set by a process that loaded derived state before listening; the
+        # first connection then resyncs only if something changed since.
+        self.watermark = None
+
+    def subscribe(self, tables, handler):
+        for table in tables:
+            self._subscribers.setdefault(table, []).append(handler)
+
+    def on_resync(self, handler):
+        self._resync.append(handler)
+
+    @property
+    def active(self):
+        return self.listening is not None and self.listening.is_set()
+
+    def dispatch(self, change):
+        for handler in self._subscribers.get(change.table, ()):
+            try:
+                handler(change)
+            except Exception:
+                logger.exception('change handler failed for %s', change)
+
+    def resync(self):
+        # Changes may have been missed while disconnected, or before this
+        # process started listening, so drop derived state and let it reload lazily.
+        for handler in self._resync:
+            handler()
+
+    async def changed_since_watermark(self, connection):
+        watermark, self.watermark = self.watermark, None
+        return watermark is None or await connection.fetchval(WATERMARK_QUERY) != watermark
+
+    def _on_notify(self, connection, pid, channel, payload):
+        message = json.loads(payload)
+        self.dispatch(Change(message['table'], message['op'], message['row']))
+
+    async def run(self, dsn):
+        while True:
+            try:
+                connection = await asyncpg.connect(dsn)
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning('change feed connection failed: %s', e)
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            try:
+                await connection.add_listener(self.channel, self._on_notify)
+                if await self.changed_since_watermark(connection):
+                    self.resync()
+                self.listening.set()
+                while not connection.is_closed():
+                    await asyncio.sleep(self.reconnect_delay)
+                logger.warning('change feed connection lost, reconnecting')
+            finally:
+                self.listening.clear()
+                await connection.close()
+
+    def start(self, dsn):
+        self.listening = asyncio.Event()
+        self._task = asyncio.ensure_future(self.run(dsn))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+change_feed = ChangeFeed(CHANNEL)
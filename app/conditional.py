@@ -0,0 +1,42 @@
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def validator_headers(etag, last_modified):
+    if last_modified is None:
+        return {'ETag': etag}
+    return {'ETag': etag, 'Last-Modified': format_datetime(last_modified.astimezone(timezone.utc).replace(microsecond=0),
+                                                               usegmt=True)}
+
+
+def is_not_modified(request: Request, etag, last_modified):
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+        weak_etag = etag[2:] if etag.startswith('W/') else etag
+        return '*' in candidates or any(
+            (candidate[2:] if candidate.startswith('W/') else candidate) == weak_etag for candidate in candidates)
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_response(request: Request, response: Response, etag, last_modified=None):
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from pydantic import BaseSettings
 
 
@@ -10,8 +12,54 @@ class Settings(BaseSettings):
     POSTGRES_HOSTNAME: str
     CLIENT_ORIGIN: str
 
+    RECOMMENDER_ENGINE: str = 'sql'
+    SNAPSHOT_PATH: str = './skill_matrix.snapshot'
+    SNAPSHOT_CHECK_INTERVAL: float = 1.0
+    SNAPSHOT_REBUILD_DELAY: float = 5.0
+
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_TIMEOUT: int = 0
+    DB_PGBOUNCER: bool = False
+
+    CACHE_BACKEND: str = 'memory'
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_TTL: int = 60
+    CACHE_REDIS_URL: str = 'redis://localhost:6379/0'
+
+    SLOW_QUERY_MS: float = 0
+
+    BATCH_MAX_IDS: int = 100
+
+    CHANGE_FEED: bool = False
+
+    WEB_HOST: str = '0.0.0.0'
+    WEB_PORT: int = 8000
+    WEB_WORKERS: int = 1
+    WEB_PRELOAD: bool = True
+    WEB_GRACEFUL_TIMEOUT: int = 30
+    WEB_MAX_REQUESTS: int = 0
+    WEB_MAX_REQUESTS_JITTER: int = 0
+
     class Config:
         env_file = './.env'
 
 
-settings = Settings()
+@lru_cache()
+def get_settings():
+    return Settings()
+
+
+class LazySettings:
+    # Defers reading the environment and .env until a setting is first used.
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+
+
+settings = LazySettings()
@@ -0,0 +1,58 @@
+import argparse
+
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def currency_code(currency):
+    return currency.strip().upper()
+
+
+def usd_rate(currency):
+    return select(models.CurrencyRate.usd_rate).where(
+        models.CurrencyRate.currency == currency_code(currency)
+    ).scalar_subquery()
+
+
+def normalized_salary(salary, currency):
+    return literal(salary) * usd_rate(currency)
+
+
+def usd_rates(db: Session):
+    return dict(db.execute(select(models.CurrencyRate.currency, models.CurrencyRate.usd_rate)).all())
+
+
+def set_rate(db: Session, currency, rate):
+    code = currency_code(currency)
+    db.execute(insert(models.CurrencyRate).values(currency=code, usd_rate=rate).on_conflict_do_update(
+        index_elements=[models.CurrencyRate.currency], set_={'usd_rate': rate, 'updated_at': func.now()}
+    ))
+    result = db.execute(
+        update(models.Vacancy).where(func.upper(models.Vacancy.currency) == code)
+        .values(salary_usd=models.Vacancy.salary * rate).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Set a currency's USD rate and renormalize vacancy salaries")
+    parser.add_argument("currency")
+    parser.add_argument("usd_rate", type=float, help="USD per unit of the currency")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        updated = set_rate(db, args.currency, args.usd_rate)
+        db.commit()
+    finally:
+        db.close()
+    print(f"{currency_code(args.currency)}={args.usd_rate} vacancies updated={updated}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,129 @@
+import time
+from functools import lru_cache
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from . import metrics
 from .config import settings
+from .instrumentation import instrument_engine, record_pool_wait
+
+
+def database_url(driver='postgresql'):
+    return f"{driver}://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}" \
+           f"@{settings.POSTGRES_HOSTNAME}:{settings.DATABASE_PORT}/{settings.POSTGRES_DB}"
+
+
+POOL_CHECKOUT_WAIT = metrics.Histogram('db_pool_checkout_wait_seconds',
+                                       'Time spent waiting for a pooled connection', ['engine'])
+
+
+class TimedPoolMixin:
+    engine_label = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            POOL_CHECKOUT_WAIT.observe(elapsed, engine=self.engine_label)
+            record_pool_wait(elapsed)
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    engine_label = 'sync'
+
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    engine_label = 'async'
+
+
+def pool_options():
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def connect_args():
+    # PgBouncer in transaction mode rejects unknown startup parameters, so the
+    # statement timeout has to be configured on its side (or per role) instead.
+    if settings.DB_STATEMENT_TIMEOUT and not settings.DB_PGBOUNCER:
+        return {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT}"}
+    return {}
+
+
+def async_connect_args():
+    if settings.DB_PGBOUNCER:
+        return {"statement_cache_size": 0}
+    if settings.DB_STATEMENT_TIMEOUT:
+        return {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT)}}
+    return {}
+
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}" \
-                          f"@{settings.POSTGRES_HOSTNAME}:{settings.DATABASE_PORT}/{settings.POSTGRES_DB}"
+@lru_cache()
+def get_engine():
+    engine = create_engine(database_url(), poolclass=TimedQueuePool, connect_args=connect_args(), **pool_options())
+    instrument_engine(engine)
+    return engine
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@lru_cache()
+def get_async_engine():
+    async_engine = create_async_engine(
+        database_url('postgresql+asyncpg') + ("?prepared_statement_cache_size=0" if settings.DB_PGBOUNCER else ""),
+        poolclass=TimedAsyncAdaptedQueuePool, connect_args=async_connect_args(), **pool_options()
+    )
+    instrument_engine(async_engine.sync_engine)
+    return async_engine
+
+
+@lru_cache()
+def session_factory():
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+@lru_cache()
+def async_session_factory():
+    return sessionmaker(autoflush=False, expire_on_commit=False, bind=get_async_engine(), class_=AsyncSession)
+
+
+def SessionLocal():
+    return session_factory()()
+
+
+def AsyncSessionLocal():
+    return async_session_factory()()
+
+
+async def dispose_engines():
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
+
+
+def pool_status():
+    if get_engine.cache_info().currsize:
+        yield 'sync', get_engine().pool
+    if get_async_engine.cache_info().currsize:
+        yield 'async', get_async_engine().sync_engine.pool
+
+
+metrics.Gauge('db_pool_checked_out', 'Connections currently checked out of the pool', ['engine'],
+              collect=lambda: [({'engine': label}, pool.checkedout()) for label, pool in pool_status()])
+metrics.Gauge('db_pool_idle', 'Idle connections kept in the pool', ['engine'],
+              collect=lambda: [({'engine': label}, pool.checkedin()) for label, pool in pool_status()])
+metrics.Gauge('db_pool_overflow', 'Connections opened beyond the pool size', ['engine'],
+              collect=lambda: [({'engine': label}, max(pool.overflow(), 0)) for label, pool in pool_status()])
 
 Base = declarative_base()
-Base.metadata.create_all(engine)
 
 
 def get_db():
@@ -21,3 +132,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,333 @@
+import argparse
+import codecs
+import csv
+import io
+import json
+import sys
+import uuid
+
+import psycopg2
+from anyio import from_thread
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .cache import cache
+from .change_feed import BULK_ROWS, change_feed
+from .currency import currency_code, usd_rates
+from .recommender import materialized_matches_enabled, refresh_user_matches, refresh_vacancy_matches
+from .skill_index import skill_index
+from .snapshot import skill_snapshot
+
+BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def checkpoint(self):
+        return self.inserted, self.failed, len(self.errors)
+
+    def restore(self, checkpoint):
+        self.inserted, self.failed, errors_qty = checkpoint
+        del self.errors[errors_qty:]
+
+    def dict(self):
+        return {"processed": self.processed, "inserted": self.inserted, "failed": self.failed,
+                "errors": self.errors}
+
+
+class RecordParser:
+    def __init__(self, fmt='ndjson'):
+        if fmt not in ('ndjson', 'csv'):
+            raise ValueError(f'Unsupported import format: {fmt}')
+        self.fmt = fmt
+
+    def records(self, lines):
+        """Yield (line, record) pairs; a record that does not parse is replaced by its error."""
+        if self.fmt == 'ndjson':
+            for line, text in enumerate(lines, 1):
+                if text.strip():
+                    yield line, self._parse_json(text)
+            return
+
+        # One reader over the whole stream, so quoted fields may span lines.
+        reader = csv.reader(lines)
+        header = None
+        while True:
+            line = reader.line_num + 1
+            try:
+                values = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield line, e
+                continue
+            if not values:
+                continue
+            if header is None:
+                header = values
+                continue
+            record = dict(zip(header, values))
+            if 'skills' in record:
+                skills = self._parse_json(record['skills'] or '[]')
+                if isinstance(skills, ValueError):
+                    yield line, skills
+                    continue
+                record['skills'] = skills
+            yield line, record
+
+    @staticmethod
+    def _parse_json(text):
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            return e
+
+
+def copy_rows(db: Session, table, columns, rows, not_null=()):
+    if not rows:
+        return
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    # csv.writer writes '' and None alike, and COPY reads both as NULL unless told otherwise.
+    options = f", FORCE_NOT_NULL ({', '.join(not_null)})" if not_null else ''
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv{options})", buffer)
+    finally:
+        cursor.close()
+
+
+def existing_skill_ids(db: Session, records):
+    skill_ids = {skill.id for _, record in records for skill in record.skills}
+    if not skill_ids:
+        return set()
+    return set(db.execute(select(models.Skill.id).where(models.Skill.id.in_(skill_ids))).scalars())
+
+
+def check_skills(record, known_skill_ids):
+    skill_ids = [skill.id for skill in record.skills]
+    if len(set(skill_ids)) != len(skill_ids):
+        return [{"loc": ["skills"], "msg": "duplicate skill id", "type": "value_error"}]
+    unknown = sorted(set(skill_ids) - known_skill_ids)
+    if unknown:
+        return [{"loc": ["skills"], "msg": f"unknown skill ids: {unknown}", "type": "value_error"}]
+    return None
+
+
+def load_vacancies(db: Session, records, report: ImportReport):
+    known_skill_ids = existing_skill_ids(db, records)
+    rates = usd_rates(db)
+    vacancies, vacancy_skills = [], []
+
+    for line, record in records:
+        errors = check_skills(record, known_skill_ids)
+        if errors:
+            report.add_error(line, errors)
+            continue
+        vacancy_id = uuid.uuid4()
+        rate = rates.get(currency_code(record.currency))
+        vacancies.append((vacancy_id, record.position_name, record.company_name, record.salary, record.currency,
+                          None if rate is None else record.salary * rate))
+        vacancy_skills.extend((skill.id, vacancy_id, skill.years) for skill in record.skills)
+
+    copy_rows(db, 'vacancies', ['id', 'position_name', 'company_name', 'salary', 'currency', 'salary_usd'],
+              vacancies, not_null=['position_name', 'company_name', 'currency'])
+    copy_rows(db, 'vacancies_skills', ['skill_id', 'vacancy_id', 'years'], vacancy_skills)
+    if materialized_matches_enabled():
+        for vacancy in vacancies:
+            refresh_vacancy_matches(db, vacancy[0])
+    report.inserted += len(vacancies)
+
+    def publish():
+        # A listening change feed delivers these rows to this worker as well.
+        if not change_feed.active:
+            if len(vacancy_skills) > BULK_ROWS:
+                skill_index.clear()
+            else:
+                skills = {}
+                for skill_id, vacancy_id, years in vacancy_skills:
+                    skills.setdefault(vacancy_id, []).append((skill_id, years))
+                for vacancy in vacancies:
+                    skill_index.add_vacancy(vacancy[0], skills.get(vacancy[0], []))
+        skill_snapshot.schedule_rebuild()
+        cache.bump('recommend')
+    return publish
+
+
+def load_users(db: Session, records, report: ImportReport):
+    known_skill_ids = existing_skill_ids(db, records)
+    emails = {record.email.lower() for _, record in records}
+    taken = set(db.execute(
+        select(func.lower(models.User.email)).where(func.lower(models.User.email).in_(emails))
+    ).scalars())
+    users, user_skills = [], []
+
+    for line, record in records:
+        errors = check_skills(record, known_skill_ids)
+        if errors is None and record.email.lower() in taken:
+            errors = [{"loc": ["email"], "msg": "User already exist", "type": "value_error"}]
+        if errors:
+            report.add_error(line, errors)
+            continue
+        taken.add(record.email.lower())
+        user_id = uuid.uuid4()
+        users.append((user_id, record.first_name, record.last_name, record.email, record.years_prev_exp))
+        user_skills.extend((skill.id, user_id, skill.years) for skill in record.skills)
+
+    copy_rows(db, 'users', ['id', 'first_name', 'last_name', 'email', 'years_prev_exp'], users,
+              not_null=['first_name', 'last_name', 'email'])
+    copy_rows(db, 'users_skills', ['skill_id', 'user_id', 'years'], user_skills)
+    if materialized_matches_enabled():
+        for user in users:
+            refresh_user_matches(db, user[0])
+    report.inserted += len(users)
+
+
+LOADERS = {
+    'vacancies': (schemas.RegisterVacancySchema, load_vacancies),
+    'users': (schemas.RegisterUserSchema, load_users),
+}
+
+
+class BulkImporter:
+    def __init__(self, db: Session, kind, fmt='ndjson', batch_size=BATCH_SIZE, progress=None):
+        self.db = db
+        self.schema, self.loader = LOADERS[kind]
+        self.parser = RecordParser(fmt)
+        self.batch_size = batch_size
+        self.progress = progress
+        self.report = ImportReport()
+
+    def load_batch(self, parsed):
+        valid = []
+        for line, record in parsed:
+            self.report.processed += 1
+            try:
+                valid.append((line, self.schema.parse_obj(record)))
+            except ValidationError as e:
+                self.report.add_error(line, e.errors())
+
+        if valid:
+            self.load(valid)
+        if self.progress is not None:
+            self.progress(self.report)
+
+    def load(self, records):
+        # Earlier batches are already committed, so a batch the database rejects
+        # is retried row by row and only the offending rows are reported.
+        checkpoint = self.report.checkpoint()
+        try:
+            publish = self.loader(self.db, records, self.report)
+            self.db.commit()
+        except (DBAPIError, psycopg2.Error) as e:
+            self.db.rollback()
+            self.report.restore(checkpoint)
+            if len(records) == 1:
+                self.report.add_error(records[0][0], [{"loc": [], "msg": str(getattr(e, 'orig', e)).splitlines()[0],
+                                                       "type": "value_error.database"}])
+                return
+            for record in records:
+                self.load([record])
+            return
+        if publish is not None:
+            publish()
+
+    def run(self, lines):
+        batch = []
+        for line, record in self.parser.records(lines):
+            if isinstance(record, Exception):
+                self.report.processed += 1
+                self.report.add_error(line, [{"loc": [], "msg": str(record), "type": "value_error.parse"}])
+                continue
+            batch.append((line, record))
+            if len(batch) >= self.batch_size:
+                self.load_batch(batch)
+                batch = []
+        if batch:
+            self.load_batch(batch)
+        return self.report
+
+
+def iter_lines(chunks):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def iter_chunks(chunks):
+    chunks = chunks.__aiter__()
+
+    async def next_chunk():
+        return await chunks.__anext__()
+
+    while True:
+        try:
+            yield from_thread.run(next_chunk)
+        except StopAsyncIteration:
+            return
+
+
+async def import_stream(db: Session, kind, chunks, fmt='ndjson', batch_size=BATCH_SIZE):
+    # The whole import runs on one worker thread, which pulls body chunks from the event loop.
+    importer = BulkImporter(db, kind, fmt, batch_size)
+    return await run_in_threadpool(importer.run, iter_lines(iter_chunks(chunks)))
+
+
+def request_format(request):
+    return 'csv' if 'csv' in request.headers.get('content-type', '') else 'ndjson'
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk load users or vacancies from NDJSON or CSV")
+    parser.add_argument("kind", choices=sorted(LOADERS))
+    parser.add_argument("path", help="input file, '-' for stdin")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.path.endswith('.csv') else 'ndjson')
+
+    def progress(report):
+        print(f"processed={report.processed} inserted={report.inserted} failed={report.failed}", file=sys.stderr)
+
+    source = sys.stdin if args.path == "-" else open(args.path, newline="")
+    db = SessionLocal()
+    try:
+        report = BulkImporter(db, args.kind, fmt, args.batch_size, progress).run(source)
+    finally:
+        db.close()
+        if source is not sys.stdin:
+            source.close()
+    json.dump(report.dict(), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
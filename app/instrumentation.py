@@ -0,0 +1,92 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from . import metrics
+from .config import settings
+
+logger = logging.getLogger('app.slow_query')
+
+REQUEST_DURATION = metrics.Histogram('http_request_duration_seconds', 'Request latency', ['method', 'route'])
+REQUEST_DB_TIME = metrics.Histogram('http_request_db_seconds', 'Time spent in SQL statements per request',
+                                    ['method', 'route'])
+REQUEST_POOL_WAIT = metrics.Histogram('http_request_pool_wait_seconds', 'Pool checkout wait per request',
+                                      ['method', 'route'])
+REQUEST_SERIALIZATION = metrics.Histogram('http_request_serialization_seconds', 'JSON encoding time per request',
+                                          ['method', 'route'])
+REQUEST_STATEMENTS = metrics.Histogram('http_request_statements', 'SQL statements issued per request',
+                                       ['method', 'route'], buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+
+current_stats = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self, scope=None):
+        self.scope = scope or {}
+        self.statements = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        self.serialization = 0.0
+
+    @property
+    def route(self):
+        route = self.scope.get('route')
+        return route.path if route is not None else self.scope.get('path', '-')
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.statements} statements"',
+            f'pool;dur={self.pool_wait * 1000:.2f}',
+            f'serialize;dur={self.serialization * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+    def observe(self, method, total, streamed=False):
+        labels = {'method': method, 'route': self.route}
+        REQUEST_DURATION.observe(total, **labels)
+        REQUEST_DB_TIME.observe(self.db_time, **labels)
+        REQUEST_POOL_WAIT.observe(self.pool_wait, **labels)
+        # Streamed bodies are encoded chunk by chunk outside FastJSONResponse, so there is no figure to report.
+        if not streamed:
+            REQUEST_SERIALIZATION.observe(self.serialization, **labels)
+        REQUEST_STATEMENTS.observe(self.statements, **labels)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    stats = current_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += elapsed
+    if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        logger.warning('slow query %.1f ms on %s: %s', elapsed * 1000,
+                       stats.route if stats is not None else '-', statement)
+
+
+def handle_error(context):
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+
+def record_pool_wait(elapsed):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.pool_wait += elapsed
+
+
+def record_serialization(elapsed):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.serialization += elapsed
+
+
+def instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(engine, 'handle_error', handle_error)
@@ -0,0 +1,38 @@
+from fastapi import HTTPException, status
+from sqlalchemy import any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+
+def ids_param(id_column, ids):
+    return bindparam(f'{id_column.key}_ids', ids, type_=ARRAY(id_column.type))
+
+
+def fetch_by_ids(db: Session, statement, id_column, ids):
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > settings.BATCH_MAX_IDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f'At most {settings.BATCH_MAX_IDS} ids per request')
+    if not ids:
+        return [], []
+
+    rows = {row.id: row for row in db.execute(statement.where(id_column == any_(ids_param(id_column, ids))))}
+    return [rows[row_id] for row_id in ids if row_id in rows], [row_id for row_id in ids if row_id not in rows]
+
+
+def linked_skills(db: Session, link_model, owner_column, owner_ids):
+    skills = {owner_id: [] for owner_id in owner_ids}
+    if not owner_ids:
+        return skills
+    rows = db.execute(
+        select(owner_column, models.Skill.id, models.Skill.name, link_model.years)
+        .join(models.Skill, models.Skill.id == link_model.skill_id)
+        .where(owner_column == any_(ids_param(owner_column, list(owner_ids))))
+        .order_by(owner_column, models.Skill.id)
+    )
+    for owner_id, skill_id, name, years in rows:
+        skills[owner_id].append({'id': skill_id, 'name': name, 'years': years})
+    return skills
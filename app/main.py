@@ -1,23 +1,89 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from app import metrics
+from app.change_feed import change_feed
 from app.config import settings
+from app.database import database_url, dispose_engines, get_async_engine, get_engine
+from app.instrumentation import RequestStats, current_stats
+from app.responses import FastJSONResponse
 from app.routers import vacancy, user, skill
 
-app = FastAPI()
 
-origins = [
-    settings.CLIENT_ORIGIN,
-]
+class SettingsCORSMiddleware:
+    # Reads CLIENT_ORIGIN on the first request instead of at import.
+    def __init__(self, app, **options):
+        self.app = app
+        self.options = options
+        self.middleware = None
+
+    async def __call__(self, scope, receive, send):
+        if self.middleware is None:
+            self.middleware = CORSMiddleware(self.app, allow_origins=[settings.CLIENT_ORIGIN], **self.options)
+        await self.middleware(scope, receive, send)
+
+
+app = FastAPI(default_response_class=FastJSONResponse)
 
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
+    SettingsCORSMiddleware,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 
+@app.on_event('startup')
+async def open_engines():
+    get_engine()
+    get_async_engine()
+
+
+@app.on_event('startup')
+async def start_change_feed():
+    if settings.CHANGE_FEED or settings.WEB_WORKERS > 1:
+        change_feed.start(database_url())
+
+
+@app.on_event('shutdown')
+async def stop_change_feed():
+    await change_feed.stop()
+
+
+@app.on_event('shutdown')
+async def close_engines():
+    await dispose_engines()
+
+
+@app.middleware('http')
+async def instrument_request(request: Request, call_next):
+    stats = RequestStats(request.scope)
+    token = current_stats.set(stats)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        current_stats.reset(token)
+    if 'content-length' not in response.headers:
+        # A streamed body is still being produced: observe once it is sent, and
+        # send no Server-Timing header, which could only report the time to first byte.
+        response.body_iterator = observe_streamed(response.body_iterator, stats, request.method, started)
+        return response
+    total = time.perf_counter() - started
+    response.headers['Server-Timing'] = stats.server_timing(total)
+    stats.observe(request.method, total)
+    return response
+
+
+async def observe_streamed(body, stats, method, started):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        stats.observe(method, time.perf_counter() - started, streamed=True)
+
+
 app.include_router(user.router, tags=['Users'], prefix='/api/users')
 app.include_router(vacancy.router, tags=['Vacancies'], prefix='/api/vacancies')
 app.include_router(skill.router, tags=['Skill'], prefix='/api/skills')
@@ -26,3 +92,8 @@ app.include_router(skill.router, tags=['Skill'], prefix='/api/skills')
 @app.get('/api/healthchecker')
 def root():
     return {'message': 'UP'}
+
+
+@app.get('/metrics', include_in_schema=False)
+def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
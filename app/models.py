@@ -1,6 +1,7 @@
 import uuid
+from .change_feed import BULK_ROWS
 from .database import Base
-from sqlalchemy import TIMESTAMP, Column, ForeignKey, String, Integer, text, Float
+from sqlalchemy import DDL, TIMESTAMP, Column, ForeignKey, Index, Sequence, String, Integer, event, func, text, Float
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -9,16 +10,27 @@ class Skill(Base):
     __tablename__ = 'skills'
     id = Column(Integer, primary_key=True, default=None)
     name = Column(String, nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=text("now()"), onupdate=func.now())
     users = relationship("User", secondary="users_skills", back_populates='skills')
     vacancies = relationship("Vacancy", secondary="vacancies_skills", back_populates='skills')
 
+    __table_args__ = (
+        Index('ix_skills_name_prefix', func.lower(name).label('lower_name'),
+              postgresql_ops={'lower_name': 'text_pattern_ops'}),
+    )
+
 
 class UserSkill(Base):
     __tablename__ = 'users_skills'
-    skill_id = Column(ForeignKey('skills.id'), primary_key=True)
-    user_id = Column(ForeignKey('users.id'), primary_key=True)
+    skill_id = Column(ForeignKey('skills.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
     years = Column(Integer, nullable=False)
 
+    __table_args__ = (
+        Index('ix_users_skills_user_id', user_id, skill_id, years),
+    )
+
 
 class User(Base):
     __tablename__ = 'users'
@@ -26,22 +38,30 @@ class User(Base):
                 default=uuid.uuid4)
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
-    email = Column(String, unique=True, nullable=False)
+    email = Column(String, nullable=False)
 
     years_prev_exp = Column(Integer, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True),
                         nullable=False, server_default=text("now()"))
     updated_at = Column(TIMESTAMP(timezone=True),
-                        nullable=False, server_default=text("now()"))
+                        nullable=False, server_default=text("now()"), onupdate=func.now())
     skills = relationship("Skill", secondary=UserSkill.__table__, back_populates='users')
 
+    __table_args__ = (
+        Index('ux_users_email_lower', func.lower(email), unique=True),
+    )
+
 
 class VacancySkill(Base):
     __tablename__ = 'vacancies_skills'
-    skill_id = Column(ForeignKey('skills.id'), primary_key=True)
-    vacancy_id = Column(ForeignKey('vacancies.id'), primary_key=True)
+    skill_id = Column(ForeignKey('skills.id', ondelete='CASCADE'), primary_key=True)
+    vacancy_id = Column(ForeignKey('vacancies.id', ondelete='CASCADE'), primary_key=True)
     years = Column(Integer, nullable=False)
 
+    __table_args__ = (
+        Index('ix_vacancies_skills_vacancy_id', vacancy_id, skill_id, years),
+    )
+
 
 class Vacancy(Base):
     __tablename__ = 'vacancies'
@@ -51,8 +71,93 @@ class Vacancy(Base):
     company_name = Column(String, nullable=False)
     salary = Column(Float, nullable=False)
     currency = Column(String, nullable=False)
+    salary_usd = Column(Float, nullable=True)
     skills = relationship("Skill", secondary="vacancies_skills", back_populates='vacancies')
     created_at = Column(TIMESTAMP(timezone=True),
                         nullable=False, server_default=text("now()"))
     updated_at = Column(TIMESTAMP(timezone=True),
-                        nullable=False, server_default=text("now()"))
+                        nullable=False, server_default=text("now()"), onupdate=func.now())
+
+    __table_args__ = (
+        Index('ix_vacancies_salary_usd', salary_usd),
+        Index('ix_vacancies_currency_salary_usd', func.upper(currency), salary_usd),
+    )
+
+
+class CurrencyRate(Base):
+    __tablename__ = 'currency_rates'
+    currency = Column(String, primary_key=True)
+    usd_rate = Column(Float, nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=text("now()"), onupdate=func.now())
+
+
+class UserVacancyMatch(Base):
+    __tablename__ = 'user_vacancy_matches'
+    user_id = Column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    vacancy_id = Column(ForeignKey('vacancies.id', ondelete='CASCADE'), primary_key=True, index=True)
+    matched = Column(Integer, nullable=False)
+    required = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('ix_user_vacancy_matches_user_score', user_id, score.desc(), vacancy_id),
+    )
+
+
+# Bumped by every change-feed trigger; lets a process tell whether anything
+# changed since it loaded its derived state.
+CHANGE_FEED_SEQUENCE = Sequence('change_feed_seq', metadata=Base.metadata)
+
+# Statement-level, so a bulk COPY sends one notification instead of one per row.
+NOTIFY_CHANGE_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_change() RETURNS trigger AS $$
+DECLARE
+    changed jsonb;
+    keys jsonb;
+    column_name text;
+BEGIN
+    IF NOT EXISTS (SELECT FROM changed_rows) THEN
+        RETURN NULL;
+    END IF;
+    PERFORM nextval('change_feed_seq');
+    IF (SELECT count(*) FROM (SELECT FROM changed_rows LIMIT {limit}) AS bounded) > {bulk_rows} THEN
+        PERFORM pg_notify('hunty_changes',
+                          jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'row', NULL)::text);
+        RETURN NULL;
+    END IF;
+    FOR changed IN SELECT to_jsonb(changed_rows) FROM changed_rows LOOP
+        keys := '{{}}'::jsonb;
+        FOREACH column_name IN ARRAY TG_ARGV LOOP
+            keys := keys || jsonb_build_object(column_name, changed -> column_name);
+        END LOOP;
+        PERFORM pg_notify('hunty_changes',
+                          jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'row', keys)::text);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""".format(bulk_rows=BULK_ROWS, limit=BULK_ROWS + 1)
+
+CHANGE_FEED_COLUMNS = {
+    'skills': ('id', 'name'),
+    'users': ('id',),
+    'users_skills': ('user_id', 'skill_id', 'years'),
+    'vacancies': ('id',),
+    'vacancies_skills': ('vacancy_id', 'skill_id', 'years'),
+}
+
+
+def change_feed_triggers(table, columns):
+    arguments = ', '.join(f"'{column}'" for column in columns)
+    # Transition tables allow one event per trigger.
+    for op, transition in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        yield f'CREATE TRIGGER {table}_change_feed_{op.lower()} AFTER {op} ON {table} ' \
+              f'REFERENCING {transition} TABLE AS changed_rows ' \
+              f'FOR EACH STATEMENT EXECUTE PROCEDURE notify_change({arguments})'
+
+
+event.listen(Base.metadata, 'before_create', DDL(NOTIFY_CHANGE_FUNCTION.replace('%', '%%')))
+for table_name, table_columns in CHANGE_FEED_COLUMNS.items():
+    for trigger in change_feed_triggers(table_name, table_columns):
+        event.listen(Base.metadata.tables[table_name], 'after_create', DDL(trigger))
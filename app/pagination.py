@@ -0,0 +1,49 @@
+import base64
+import binascii
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+MAX_LIMIT = 100
+
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(':'.join(str(value) for value in values).encode()).decode()
+
+
+def decode_cursor(cursor, *types):
+    try:
+        values = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        if len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(value_type(value) for value_type, value in zip(types, values))
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f'Invalid cursor: {cursor}')
+
+
+def paginate(db: Session, statement, key, limit: int = 10, page: int = 1, cursor: str = None):
+    statement = statement.order_by(key)
+    if cursor:
+        statement = statement.where(key > decode_cursor(cursor, key.type.python_type)[0])
+    else:
+        statement = statement.offset((page - 1) * limit)
+
+    rows = db.execute(statement.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], key.key))
+    return rows, next_cursor
+
+
+def ranked_cursor(ranked, limit: int, rank=None):
+    if ranked and len(ranked) == limit:
+        row, score = ranked[-1]
+        return encode_cursor(repr(float(score if rank is None else rank(row, score))), row.id)
+    return None
+
+
+def prefix_pattern(search):
+    escaped = search.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'{escaped}%'
@@ -0,0 +1,306 @@
+import argparse
+import heapq
+import uuid
+
+from sqlalchemy import Float, and_, cast, delete, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .currency import currency_code
+from .skill_index import skill_index
+from .snapshot import skill_snapshot
+
+MATCH_THRESHOLD = 50
+MATCHES_LOCK_ID = 4004
+
+VACANCY_COLUMNS = (models.Vacancy.id, models.Vacancy.position_name, models.Vacancy.company_name,
+                   models.Vacancy.salary, models.Vacancy.currency, models.Vacancy.salary_usd)
+USER_COLUMNS = (models.User.id, models.User.first_name, models.User.last_name, models.User.email)
+
+
+class VacancyFilter:
+    def __init__(self, min_salary=None, currency=None, sort='score'):
+        self.min_salary = min_salary
+        self.currency = currency_code(currency) if currency else None
+        self.sort = sort
+
+    def clauses(self):
+        clauses = []
+        if self.min_salary is not None:
+            clauses.append(models.Vacancy.salary_usd >= self.min_salary)
+        if self.currency is not None:
+            clauses.append(func.upper(models.Vacancy.currency) == self.currency)
+        if self.sort == 'salary':
+            clauses.append(models.Vacancy.salary_usd.isnot(None))
+        return clauses
+
+    def rank_column(self, score_column):
+        return models.Vacancy.salary_usd if self.sort == 'salary' else score_column
+
+    def rank(self, vacancy, score):
+        return vacancy.salary_usd if self.sort == 'salary' else score
+
+
+NO_FILTER = VacancyFilter()
+
+
+def match_score(matched, required):
+    return cast(matched, Float) * 100 / required
+
+
+def after_clause(score_column, id_column, after):
+    if after is None:
+        return None
+    after_score, after_id = after
+    return or_(score_column < after_score, and_(score_column == after_score, id_column > after_id))
+
+
+def matching_vacancies(user_id):
+    candidate_skill = models.VacancySkill.__table__.alias('candidate_skill')
+    candidate_user_skill = models.UserSkill.__table__.alias('candidate_user_skill')
+    candidates = select(candidate_skill.c.vacancy_id).join(
+        candidate_user_skill,
+        and_(candidate_user_skill.c.skill_id == candidate_skill.c.skill_id,
+             candidate_user_skill.c.years >= candidate_skill.c.years)
+    ).where(candidate_user_skill.c.user_id == user_id)
+
+    matched = func.count(models.UserSkill.skill_id)
+    required = func.count(models.VacancySkill.skill_id)
+    return select(
+        models.VacancySkill.vacancy_id.label('vacancy_id'),
+        matched.label('matched'),
+        required.label('required'),
+        match_score(matched, required).label('score'),
+    ).outerjoin(
+        models.UserSkill,
+        and_(models.UserSkill.skill_id == models.VacancySkill.skill_id,
+             models.UserSkill.user_id == user_id,
+             models.UserSkill.years >= models.VacancySkill.years)
+    ).where(
+        models.VacancySkill.vacancy_id.in_(candidates)
+    ).group_by(
+        models.VacancySkill.vacancy_id
+    ).having(matched * 100 >= required * MATCH_THRESHOLD)
+
+
+def matching_users(vacancy_id):
+    required = select(func.count()).where(models.VacancySkill.vacancy_id == vacancy_id).scalar_subquery()
+    matched = func.count()
+    return select(
+        models.UserSkill.user_id.label('user_id'),
+        matched.label('matched'),
+        required.label('required'),
+        match_score(matched, required).label('score'),
+    ).join(
+        models.VacancySkill,
+        and_(models.VacancySkill.skill_id == models.UserSkill.skill_id,
+             models.UserSkill.years >= models.VacancySkill.years)
+    ).where(
+        models.VacancySkill.vacancy_id == vacancy_id
+    ).group_by(
+        models.UserSkill.user_id
+    ).having(matched * 100 >= required * MATCH_THRESHOLD)
+
+
+def recommend_vacancies(db: Session, user_id, limit: int = 10, page: int = 1, refresh: bool = False,
+                        after=None, vacancy_filter: VacancyFilter = NO_FILTER):
+    if settings.RECOMMENDER_ENGINE == 'index':
+        return recommend_vacancies_indexed(db, user_id, limit=limit, page=page, after=after,
+                                           vacancy_filter=vacancy_filter)
+    if settings.RECOMMENDER_ENGINE == 'snapshot':
+        return recommend_vacancies_snapshot(db, user_id, limit=limit, page=page, after=after,
+                                            vacancy_filter=vacancy_filter)
+    if settings.RECOMMENDER_ENGINE == 'table':
+        if refresh:
+            refresh_user_matches(db, user_id)
+            db.commit()
+        return recommend_vacancies_materialized(db, user_id, limit=limit, page=page, after=after,
+                                                vacancy_filter=vacancy_filter)
+    return recommend_vacancies_sql(db, user_id, limit=limit, page=page, after=after, vacancy_filter=vacancy_filter)
+
+
+def ranked_page(statement, score_column, id_column, limit, page, after):
+    statement = statement.order_by(score_column.desc(), id_column).limit(limit)
+    if after is not None:
+        return statement.where(after_clause(score_column, id_column, after))
+    return statement.offset((page - 1) * limit)
+
+
+def recommend_vacancies_sql(db: Session, user_id, limit: int = 10, page: int = 1, after=None,
+                            vacancy_filter: VacancyFilter = NO_FILTER):
+    matches = matching_vacancies(user_id).subquery()
+
+    rows = db.execute(ranked_page(
+        select(*VACANCY_COLUMNS, matches.c.score).join(matches, matches.c.vacancy_id == models.Vacancy.id)
+        .where(*vacancy_filter.clauses()),
+        vacancy_filter.rank_column(matches.c.score), models.Vacancy.id, limit, page, after
+    )).all()
+    return [(vacancy, vacancy.score) for vacancy in rows]
+
+
+def user_skill_years(db: Session, user_id):
+    return dict(db.execute(
+        select(models.UserSkill.skill_id, models.UserSkill.years).where(models.UserSkill.user_id == user_id)
+    ).all())
+
+
+def recommend_vacancies_indexed(db: Session, user_id, limit: int = 10, page: int = 1, after=None,
+                                vacancy_filter: VacancyFilter = NO_FILTER):
+    if not skill_index.ensure_loaded(db):
+        return recommend_vacancies_sql(db, user_id, limit=limit, page=page, after=after,
+                                       vacancy_filter=vacancy_filter)
+    scores = skill_index.match(user_skill_years(db, user_id), MATCH_THRESHOLD)
+    return rank_scores(db, scores, limit, page, after, vacancy_filter)
+
+
+def recommend_vacancies_snapshot(db: Session, user_id, limit: int = 10, page: int = 1, after=None,
+                                 vacancy_filter: VacancyFilter = NO_FILTER):
+    snapshot = skill_snapshot.current()
+    if snapshot is None:
+        return recommend_vacancies_sql(db, user_id, limit=limit, page=page, after=after,
+                                       vacancy_filter=vacancy_filter)
+    scores = snapshot.match(user_skill_years(db, user_id), MATCH_THRESHOLD)
+    # Vacancies deleted since the snapshot was built must not take top-k slots.
+    return rank_scores(db, scores, limit, page, after, vacancy_filter, verify=True)
+
+
+def check_snapshot():
+    # Maps a newly published snapshot, bumping cached recommendations, before
+    # the response cache is consulted.
+    if settings.RECOMMENDER_ENGINE == 'snapshot':
+        skill_snapshot.current()
+
+
+def rank_scores(db: Session, scores, limit, page, after, vacancy_filter, verify=False):
+    clauses = vacancy_filter.clauses()
+    if (clauses or verify) and scores:
+        ranks = {vacancy.id: vacancy_filter.rank(vacancy, scores[vacancy.id]) for vacancy in db.execute(
+            select(models.Vacancy.id, models.Vacancy.salary_usd).where(models.Vacancy.id.in_(scores), *clauses)
+        )}
+    else:
+        ranks = scores
+
+    keys = ((-rank, vacancy_id) for vacancy_id, rank in ranks.items())
+    if after is not None:
+        keys = (key for key in keys if key > (-after[0], after[1]))
+        skip = 0
+    else:
+        skip = (page - 1) * limit
+    ranked = [vacancy_id for _, vacancy_id in heapq.nsmallest(skip + limit, keys)][skip:]
+    if not ranked:
+        return []
+
+    vacancies = {vacancy.id: vacancy for vacancy in
+                 db.execute(select(*VACANCY_COLUMNS).where(models.Vacancy.id.in_(ranked)))}
+    return [(vacancies[vacancy_id], scores[vacancy_id]) for vacancy_id in ranked if vacancy_id in vacancies]
+
+
+def recommend_vacancies_materialized(db: Session, user_id, limit: int = 10, page: int = 1, after=None,
+                                     vacancy_filter: VacancyFilter = NO_FILTER):
+    rows = db.execute(ranked_page(
+        select(*VACANCY_COLUMNS, models.UserVacancyMatch.score)
+        .join(models.UserVacancyMatch, models.UserVacancyMatch.vacancy_id == models.Vacancy.id)
+        .where(models.UserVacancyMatch.user_id == user_id, *vacancy_filter.clauses()),
+        vacancy_filter.rank_column(models.UserVacancyMatch.score), models.UserVacancyMatch.vacancy_id,
+        limit, page, after
+    )).all()
+    return [(vacancy, vacancy.score) for vacancy in rows]
+
+
+def rank_candidates(db: Session, vacancy_id, limit: int = 10, page: int = 1, after=None):
+    if materialized_matches_enabled():
+        statement = select(*USER_COLUMNS, models.UserVacancyMatch.score).join(
+            models.UserVacancyMatch, models.UserVacancyMatch.user_id == models.User.id
+        ).where(models.UserVacancyMatch.vacancy_id == vacancy_id)
+        score_column = models.UserVacancyMatch.score
+    else:
+        matches = matching_users(vacancy_id).subquery()
+        statement = select(*USER_COLUMNS, matches.c.score).join(matches, matches.c.user_id == models.User.id)
+        score_column = matches.c.score
+
+    rows = db.execute(ranked_page(statement, score_column, models.User.id, limit, page, after)).all()
+    return [(user, user.score) for user in rows]
+
+
+def all_matches():
+    required = select(models.VacancySkill.vacancy_id, func.count().label('required')).group_by(
+        models.VacancySkill.vacancy_id
+    ).subquery()
+    matched = func.count()
+    return select(
+        models.UserSkill.user_id, models.VacancySkill.vacancy_id, matched, required.c.required,
+        match_score(matched, required.c.required),
+    ).join(
+        models.VacancySkill,
+        and_(models.VacancySkill.skill_id == models.UserSkill.skill_id,
+             models.UserSkill.years >= models.VacancySkill.years)
+    ).join(
+        required, required.c.vacancy_id == models.VacancySkill.vacancy_id
+    ).group_by(
+        models.UserSkill.user_id, models.VacancySkill.vacancy_id, required.c.required
+    ).having(matched * 100 >= required.c.required * MATCH_THRESHOLD)
+
+
+def lock_matches(db: Session):
+    # Refreshes read committed links only. Taken until commit, this lock makes
+    # a refresh that waited on a concurrent one see that one's links once it
+    # commits, so a user and a vacancy registered together still match.
+    db.execute(select(func.pg_advisory_xact_lock(MATCHES_LOCK_ID)))
+
+
+def rebuild_matches(db: Session):
+    lock_matches(db)
+    db.execute(delete(models.UserVacancyMatch))
+    return db.execute(insert(models.UserVacancyMatch).from_select(
+        ['user_id', 'vacancy_id', 'matched', 'required', 'score'], all_matches()
+    )).rowcount
+
+
+def refresh_user_matches(db: Session, user_id):
+    user_id = uuid.UUID(str(user_id))
+    lock_matches(db)
+    matches = matching_vacancies(user_id).subquery()
+
+    db.execute(delete(models.UserVacancyMatch).where(models.UserVacancyMatch.user_id == user_id))
+    db.execute(insert(models.UserVacancyMatch).from_select(
+        ['user_id', 'vacancy_id', 'matched', 'required', 'score'],
+        select(literal(user_id, models.UserVacancyMatch.user_id.type), matches.c.vacancy_id,
+               matches.c.matched, matches.c.required, matches.c.score)
+    ))
+
+
+def refresh_vacancy_matches(db: Session, vacancy_id):
+    vacancy_id = uuid.UUID(str(vacancy_id))
+    lock_matches(db)
+    matches = matching_users(vacancy_id).subquery()
+
+    db.execute(delete(models.UserVacancyMatch).where(models.UserVacancyMatch.vacancy_id == vacancy_id))
+    db.execute(insert(models.UserVacancyMatch).from_select(
+        ['user_id', 'vacancy_id', 'matched', 'required', 'score'],
+        select(matches.c.user_id, literal(vacancy_id, models.UserVacancyMatch.vacancy_id.type),
+               matches.c.matched, matches.c.required, matches.c.score)
+    ))
+
+
+def materialized_matches_enabled():
+    return settings.RECOMMENDER_ENGINE == 'table'
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild the user_vacancy_matches table used by the table engine")
+    parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        matches = rebuild_matches(db)
+        db.commit()
+    finally:
+        db.close()
+    print(f"matches={matches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import json
+import time
+import uuid
+
+from fastapi.responses import JSONResponse
+
+from .instrumentation import record_serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def plain(value):
+    return str(value) if isinstance(value, uuid.UUID) else value
+
+
+def row_dict(row):
+    return {key: plain(value) for key, value in row._mapping.items()}
+
+
+def encode(content):
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        started = time.perf_counter()
+        try:
+            return encode(content)
+        finally:
+            record_serialization(time.perf_counter() - started)
@@ -1,33 +1,64 @@
+from typing import List, Optional
+
 from .. import schemas, models
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, status, APIRouter, Response
-from ..database import get_db
+from fastapi import Depends, HTTPException, Query, status, APIRouter, Request, Response
+from ..cache import cache
+from ..conditional import conditional_response, make_etag
+from ..database import get_async_db, get_db
+from ..lookup import fetch_by_ids
+from ..pagination import MAX_LIMIT, paginate, prefix_pattern
+from ..recommender import materialized_matches_enabled, refresh_vacancy_matches
+from ..responses import FastJSONResponse, row_dict
+from ..skill_catalog import skill_catalog
+from ..skill_index import skill_index
+from ..snapshot import skill_snapshot
 
 router = APIRouter()
 
 
 @router.post('/skills', status_code=status.HTTP_201_CREATED, response_model=schemas.SkillResponse)
-async def register_skill(payload: schemas.RegisterSKillSchema, db: Session = Depends(get_db)):
+async def register_skill(payload: schemas.RegisterSKillSchema, db: AsyncSession = Depends(get_async_db)):
     skill_data = payload.dict()
     new_skill = models.Skill(**skill_data)
     db.add(new_skill)
-    db.commit()
-    db.refresh(new_skill)
+    await db.commit()
+    await db.refresh(new_skill)
+    skill_catalog.put(new_skill.id, new_skill.name)
 
     return new_skill
 
 
 @router.get('/', response_model=schemas.ListSkillResponse)
-def get_skills(db: Session = Depends(get_db), limit: int = 10, page: int = 1, search: str = ''):
-    skip = (page - 1) * limit
+def get_skills(db: Session = Depends(get_db), limit: int = Query(10, ge=1, le=MAX_LIMIT),
+               page: int = Query(1, ge=1), search: str = '', cursor: Optional[str] = None):
+    statement = select(models.Skill.id, models.Skill.name)
+    if search:
+        statement = statement.where(func.lower(models.Skill.name).like(prefix_pattern(search)))
+
+    skills, next_cursor = paginate(db, statement, models.Skill.id, limit=limit, page=page, cursor=cursor)
+    return FastJSONResponse({'status': 'success', 'results': len(skills),
+                             'skills': [row_dict(skill) for skill in skills], 'next_cursor': next_cursor})
+
+
+@router.get('/autocomplete', response_model=schemas.ListSkillResponse)
+def autocomplete_skills(q: str = '', limit: int = Query(10, ge=1, le=MAX_LIMIT), db: Session = Depends(get_db)):
+    skill_catalog.ensure_loaded(db)
+    skills = [{'id': skill_id, 'name': name} for skill_id, name in skill_catalog.complete(q, limit)]
+    return FastJSONResponse({'status': 'success', 'results': len(skills), 'skills': skills, 'next_cursor': None})
 
-    skills = db.query(models.Skill).group_by(models.Skill.id).filter(
-        models.Skill.name.contains(search)).limit(limit).offset(skip).all()
-    return {'status': 'success', 'results': len(skills), 'skills': skills}
+
+@router.get('/batch', response_model=schemas.BatchSkillResponse)
+def get_skills_batch(ids: List[int] = Query(...), db: Session = Depends(get_db)):
+    skills, missing = fetch_by_ids(db, select(models.Skill.id, models.Skill.name), models.Skill.id, ids)
+    return FastJSONResponse({'status': 'success', 'results': len(skills),
+                             'skills': [row_dict(skill) for skill in skills], 'missing': missing})
 
 
 @router.put('/{id}', response_model=schemas.SkillResponse)
-def update_skill(id: str, post: schemas.RegisterSKillSchema, db: Session = Depends(get_db)):
+def update_skill(id: int, post: schemas.RegisterSKillSchema, db: Session = Depends(get_db)):
     skill_query = db.query(models.Skill).filter(models.Skill.id == id)
     updated_skill = skill_query.first()
 
@@ -37,26 +68,58 @@ def update_skill(id: str, post: schemas.RegisterSKillSchema, db: Session = Depen
 
     skill_query.update(post.dict(), synchronize_session=False)
     db.commit()
+    skill_catalog.put(updated_skill.id, updated_skill.name)
+    cache.invalidate('skill', updated_skill.id)
+    cache.bump('user')
     return updated_skill
 
 
 @router.get('/{id}', response_model=schemas.SkillResponse)
-def get_skill(id: str, db: Session = Depends(get_db)):
+def get_skill(id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    updated_at = db.execute(select(models.Skill.updated_at).where(models.Skill.id == id)).scalar()
+    if updated_at is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"No skill with this id: {id} found")
+    not_modified = conditional_response(request, response, make_etag('skill', id, updated_at), updated_at)
+    if not_modified is not None:
+        return not_modified
+
+    cache_key = cache.key('skill', id)
+    cached_skill = cache.get(cache_key)
+    if cached_skill is not None:
+        return cached_skill
+
     skill = db.query(models.Skill).filter(models.Skill.id == id).first()
     if not skill:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"No skill with this id: {id} found")
-    return skill
+    skill_response = schemas.SkillResponse.from_orm(skill).dict()
+    cache.set(cache_key, skill_response)
+    return skill_response
 
 
 @router.delete('/{id}')
-def delete_skill(id: str, db: Session = Depends(get_db)):
+def delete_skill(id: int, db: Session = Depends(get_db)):
     skill_query = db.query(models.Skill).filter(models.Skill.id == id)
     skill = skill_query.first()
     if not skill:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f'No skill with this id: {id} found')
 
+    skill_id = skill.id
+    vacancy_ids = db.execute(
+        select(models.VacancySkill.vacancy_id).where(models.VacancySkill.skill_id == skill_id)
+    ).scalars().all()
     skill_query.delete(synchronize_session=False)
+    if materialized_matches_enabled():
+        for vacancy_id in vacancy_ids:
+            refresh_vacancy_matches(db, vacancy_id)
     db.commit()
+    skill_catalog.remove(skill_id)
+    if vacancy_ids:
+        skill_index.clear()
+        skill_snapshot.schedule_rebuild()
+        cache.bump('recommend')
+    cache.invalidate('skill', skill_id)
+    cache.bump('user')
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,19 +1,35 @@
-from fastapi import APIRouter, Request, Response, status, Depends, HTTPException
-from pydantic import EmailStr
+import json
+import uuid
+from typing import List, Optional
+
+from fastapi import APIRouter, Query, Request, Response, status, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 
-from .vacancy import vacancy_skills_match
 from .. import schemas, models
+from ..batch import SkillMatrices, recommendations_ndjson
+from ..recommender import VacancyFilter, check_snapshot, materialized_matches_enabled, recommend_vacancies, \
+    refresh_user_matches
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..cache import cache
+from ..conditional import conditional_response, make_etag
+from ..database import get_async_db, get_db
+from ..importer import BATCH_SIZE, MAX_BATCH_SIZE, import_stream, request_format
+from ..lookup import fetch_by_ids, linked_skills
+from ..pagination import MAX_LIMIT, decode_cursor, paginate, ranked_cursor
+from ..responses import FastJSONResponse, row_dict
 
 router = APIRouter()
 
 
 @router.post('/register/user', status_code=status.HTTP_201_CREATED)
-async def register_user(payload: schemas.RegisterUserSchema, request: Request, db: Session = Depends(get_db)):
-    user_query = db.query(models.User).filter(
-        models.User.email == EmailStr(payload.email.lower()))
-    user = user_query.first()
+async def register_user(payload: schemas.RegisterUserSchema, request: Request,
+                        db: AsyncSession = Depends(get_async_db)):
+    user_query = await db.execute(select(models.User.id).where(
+        func.lower(models.User.email) == payload.email.lower()))
+    user = user_query.scalars().first()
 
     if user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
@@ -24,62 +40,138 @@ async def register_user(payload: schemas.RegisterUserSchema, request: Request, d
     del user_data["skills"]
     new_user = models.User(**user_data)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.flush()
+
+    if skills:
+        await db.execute(insert(models.UserSkill).values([
+            {"user_id": new_user.id, "skill_id": skill["id"], "years": skill["years"]} for skill in skills
+        ]))
+    if materialized_matches_enabled():
+        await db.run_sync(refresh_user_matches, new_user.id)
+    await db.commit()
+    cache.bump('recommend', scope=new_user.id)
+    return {'status': 'success', 'message': 'User has been created successfully'}
 
-    for skill in skills:
-        skill_data = {"user_id": new_user.id, "skill_id": skill["id"], "years": skill["years"]}
-        new_skill = models.UserSkill(**skill_data)
-        db.add(new_skill)
-        db.commit()
-        db.refresh(new_skill)
 
-    return {'status': 'success', 'message': 'User has been created successfully'}
+@router.post('/bulk', status_code=status.HTTP_201_CREATED)
+async def bulk_register_users(request: Request, db: Session = Depends(get_db),
+                              batch_size: int = Query(BATCH_SIZE, ge=1, le=MAX_BATCH_SIZE)):
+    report = await import_stream(db, 'users', request.stream(), request_format(request), batch_size)
+    return {'status': 'success', **report.dict()}
 
 
-@router.get('/{id}', response_model=schemas.UserResponse)
-def get_user(id: str, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == id).first()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"No user with this id: {id} found")
+@router.get('/', response_model=schemas.ListUserResponse)
+def get_users(db: Session = Depends(get_db), limit: int = Query(10, ge=1, le=MAX_LIMIT),
+              page: int = Query(1, ge=1), cursor: Optional[str] = None):
+    statement = select(models.User.id, models.User.first_name, models.User.last_name, models.User.email)
+    users, next_cursor = paginate(db, statement, models.User.id, limit=limit, page=page, cursor=cursor)
+    return FastJSONResponse({'status': 'success', 'results': len(users),
+                             'users': [row_dict(user) for user in users], 'next_cursor': next_cursor})
 
-    user_skills_query = db.query(models.UserSkill).filter(models.UserSkill.user_id == id).all()
-    user_response = {"id": user.id, "first_name": user.first_name, "last_name": user.last_name, "email": user.email,
-                     "skills": [{
-                         "id": data.skill_id,
-                         "name": user.skills[idx].name,
-                         "years": data.years
-                     } for idx, data in enumerate(user_skills_query)
-                     ]}
-    return user_response
+
+@router.get('/batch', response_model=schemas.BatchUserResponse)
+def get_users_batch(ids: List[uuid.UUID] = Query(...), include: Optional[str] = Query(None, regex='^skills$'),
+                    db: Session = Depends(get_db)):
+    statement = select(models.User.id, models.User.first_name, models.User.last_name, models.User.email)
+    rows, missing = fetch_by_ids(db, statement, models.User.id, ids)
+    users = [row_dict(row) for row in rows]
+    if include == 'skills':
+        skills = linked_skills(db, models.UserSkill, models.UserSkill.user_id, [row.id for row in rows])
+        for row, user in zip(rows, users):
+            user['skills'] = skills[row.id]
+    return FastJSONResponse({'status': 'success', 'results': len(users), 'users': users,
+                             'missing': [str(user_id) for user_id in missing]})
+
+
+@router.get('/{id}', response_model=schemas.UserResponse)
+def get_user(id: uuid.UUID, request: Request, response: Response, db: Session = Depends(get_db)):
+    cache_key = cache.key('user', id)
+    cached_user = cache.get(cache_key)
+    if cached_user is None:
+        rows = db.execute(
+            select(models.User, models.UserSkill.skill_id, models.Skill.name, models.UserSkill.years,
+                   models.Skill.updated_at)
+            .outerjoin(models.UserSkill, models.UserSkill.user_id == models.User.id)
+            .outerjoin(models.Skill, models.Skill.id == models.UserSkill.skill_id)
+            .where(models.User.id == id)
+            .order_by(models.UserSkill.skill_id)
+        ).all()
+        if not rows:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f"No user with this id: {id} found")
+
+        user = rows[0][0]
+        user_response = jsonable_encoder({
+            "id": user.id, "first_name": user.first_name, "last_name": user.last_name, "email": user.email,
+            "skills": [{
+                "id": skill_id,
+                "name": name,
+                "years": years
+            } for _, skill_id, name, years, _ in rows if skill_id is not None
+            ]})
+        updated_at = max([user.updated_at] + [row[4] for row in rows if row[4] is not None])
+        # Removing a skill link changes no updated_at, so the profile has no
+        # Last-Modified and only the ETag, which covers the links, validates it.
+        cached_user = {"user": user_response,
+                       "etag": make_etag('user', id, updated_at, json.dumps(user_response, sort_keys=True))}
+        cache.set(cache_key, cached_user)
+
+    not_modified = conditional_response(request, response, cached_user["etag"])
+    if not_modified is not None:
+        return not_modified
+    return cached_user["user"]
 
 
 @router.put('/{id}', response_model=schemas.UpdateUserResponse)
-def update_user(id: str, payload: schemas.UpdateUserSchema, db: Session = Depends(get_db)):
+def update_user(id: uuid.UUID, payload: schemas.UpdateUserSchema, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.id == id)
     updated_user = user.first()
-    if not user:
+    if not updated_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"No user with this id: {id} found")
 
     user.update(payload.dict(), synchronize_session=False)
+    if materialized_matches_enabled():
+        refresh_user_matches(db, id)
     db.commit()
+    cache.invalidate('user', id)
+    cache.bump('recommend', scope=id)
     return updated_user
 
 
-@router.get('/user/recommender/{id}', status_code=status.HTTP_200_OK)
-async def get_recommend(id: str, request: Request, db: Session = Depends(get_db)):
-    vacancies_recommended = []
-
-    user_skills_query = db.query(models.UserSkill).filter(models.UserSkill.user_id == id).all()
-    user_skills = user_skills_query
-    vacancies = db.query(models.Vacancy).all()
-
-    for vacancy in vacancies:
-        vacancy_skills = db.query(models.VacancySkill). \
-            filter(models.VacancySkill.vacancy_id == vacancy.id).all()
-        vacancy_match = vacancy_skills_match(vacancy_skills, user_skills, db)
-        if vacancy_match is not None:
-            vacancies_recommended.append(vacancy_match)
-    return vacancies_recommended
+@router.get('/user/recommender/{id}', status_code=status.HTTP_200_OK,
+            response_model=List[schemas.RecommendedVacancyResponse])
+async def get_recommend(id: uuid.UUID, request: Request, db: AsyncSession = Depends(get_async_db),
+                        limit: int = Query(10, ge=1, le=MAX_LIMIT), page: int = Query(1, ge=1),
+                        cursor: Optional[str] = None, refresh: bool = False,
+                        min_salary: Optional[float] = None, currency: Optional[str] = None,
+                        sort: str = Query('score', regex='^(score|salary)$'),
+                        response_format: str = Query('json', alias='format', regex='^(json|ndjson)$')):
+    after = decode_cursor(cursor, float, uuid.UUID) if cursor else None
+    vacancy_filter = VacancyFilter(min_salary, currency, sort)
+    check_snapshot()
+    cache_key = cache.key('recommend', id, limit, page, cursor, min_salary, vacancy_filter.currency, sort, scope=id)
+    recommendations = None if refresh else cache.get(cache_key)
+
+    if recommendations is None:
+        vacancies_recommended = await db.run_sync(recommend_vacancies, id, limit, page, refresh, after,
+                                                  vacancy_filter)
+        recommendations = {
+            "vacancies": [{**row_dict(vacancy), "score": score} for vacancy, score in vacancies_recommended],
+            "next_cursor": ranked_cursor(vacancies_recommended, limit, vacancy_filter.rank),
+        }
+        cache.set(cache_key, recommendations)
+
+    headers = {'X-Next-Cursor': recommendations["next_cursor"]} if recommendations["next_cursor"] else {}
+    if response_format == 'ndjson':
+        # A page is bounded by limit and already cached whole, so NDJSON is only a format, not a stream.
+        return Response("".join(json.dumps(vacancy) + "\n" for vacancy in recommendations["vacancies"]),
+                        media_type='application/x-ndjson', headers=headers)
+    return FastJSONResponse(recommendations["vacancies"], headers=headers)
+
+
+@router.post('/recommender/batch', status_code=status.HTTP_200_OK)
+def get_recommend_batch(payload: schemas.BatchRecommendSchema, db: Session = Depends(get_db)):
+    matrices = SkillMatrices.load(db, payload.user_ids)
+    return StreamingResponse(recommendations_ndjson(matrices, limit=payload.limit),
+                             media_type='application/x-ndjson')
@@ -1,50 +1,143 @@
-from fastapi import APIRouter, Depends, status, Request, HTTPException, Response
-from ..database import get_db
+import uuid
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query, status, Request, HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from ..cache import cache
+from ..currency import normalized_salary
+from ..conditional import conditional_response, make_etag
+from ..database import get_async_db, get_db
+from ..importer import BATCH_SIZE, MAX_BATCH_SIZE, import_stream, request_format
+from ..lookup import fetch_by_ids, linked_skills
+from ..pagination import MAX_LIMIT, decode_cursor, paginate, ranked_cursor
+from ..responses import FastJSONResponse, row_dict
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .. import models, schemas
+from ..recommender import MATCH_THRESHOLD, VACANCY_COLUMNS, VacancyFilter, materialized_matches_enabled, \
+    rank_candidates, ranked_page, refresh_vacancy_matches
+from ..skill_index import skill_index
+from ..snapshot import skill_snapshot
 
 router = APIRouter()
 
 
 @router.post('/vacancy', status_code=status.HTTP_201_CREATED)
-async def register_vacancy(payload: schemas.RegisterVacancySchema, request: Request, db: Session = Depends(get_db)):
+async def register_vacancy(payload: schemas.RegisterVacancySchema, request: Request,
+                           db: AsyncSession = Depends(get_async_db)):
     vacancy_data = payload.dict()
     skills = vacancy_data["skills"]
     del vacancy_data["skills"]
     new_vacancy = models.Vacancy(**vacancy_data)
+    new_vacancy.salary_usd = normalized_salary(vacancy_data["salary"], vacancy_data["currency"])
     db.add(new_vacancy)
-    db.commit()
-    db.refresh(new_vacancy)
+    await db.flush()
+
+    if skills:
+        await db.execute(insert(models.VacancySkill).values([
+            {"vacancy_id": new_vacancy.id, "skill_id": skill["id"], "years": skill["years"]} for skill in skills
+        ]))
+    if materialized_matches_enabled():
+        await db.run_sync(refresh_vacancy_matches, new_vacancy.id)
+    await db.commit()
+    skill_index.add_vacancy(new_vacancy.id, [(skill["id"], skill["years"]) for skill in skills])
+    skill_snapshot.schedule_rebuild()
+    cache.bump('recommend')
+    return {'status': 'success', 'message': 'Vacancy has been created successfully'}
 
-    for skill in skills:
-        skill_data = {"vacancy_id": new_vacancy.id, "skill_id": skill["id"], "years": skill["years"]}
-        new_skill = models.VacancySkill(**skill_data)
-        db.add(new_skill)
-        db.commit()
-        db.refresh(new_skill)
 
-    return {'status': 'success', 'message': 'Vacancy has been created successfully'}
+@router.post('/bulk', status_code=status.HTTP_201_CREATED)
+async def bulk_register_vacancies(request: Request, db: Session = Depends(get_db),
+                                  batch_size: int = Query(BATCH_SIZE, ge=1, le=MAX_BATCH_SIZE)):
+    report = await import_stream(db, 'vacancies', request.stream(), request_format(request), batch_size)
+    return {'status': 'success', **report.dict()}
+
+
+@router.get('/', response_model=schemas.ListVacancyResponse)
+def get_vacancies(db: Session = Depends(get_db), limit: int = Query(10, ge=1, le=MAX_LIMIT),
+                  page: int = Query(1, ge=1), cursor: Optional[str] = None,
+                  min_salary: Optional[float] = None, currency: Optional[str] = None,
+                  sort: str = Query('id', regex='^(id|salary)$')):
+    vacancy_filter = VacancyFilter(min_salary, currency, sort)
+    statement = select(*VACANCY_COLUMNS).where(*vacancy_filter.clauses())
+    if sort == 'salary':
+        after = decode_cursor(cursor, float, uuid.UUID) if cursor else None
+        vacancies = db.execute(ranked_page(statement, models.Vacancy.salary_usd, models.Vacancy.id,
+                                           limit, page, after)).all()
+        next_cursor = ranked_cursor([(vacancy, vacancy.salary_usd) for vacancy in vacancies], limit)
+    else:
+        vacancies, next_cursor = paginate(db, statement, models.Vacancy.id, limit=limit, page=page, cursor=cursor)
+    return FastJSONResponse({'status': 'success', 'results': len(vacancies),
+                             'vacancies': [row_dict(vacancy) for vacancy in vacancies], 'next_cursor': next_cursor})
+
+
+@router.get('/batch', response_model=schemas.BatchVacancyResponse)
+def get_vacancies_batch(ids: List[uuid.UUID] = Query(...), include: Optional[str] = Query(None, regex='^skills$'),
+                        db: Session = Depends(get_db)):
+    rows, missing = fetch_by_ids(db, select(*VACANCY_COLUMNS), models.Vacancy.id, ids)
+    vacancies = [row_dict(row) for row in rows]
+    if include == 'skills':
+        skills = linked_skills(db, models.VacancySkill, models.VacancySkill.vacancy_id, [row.id for row in rows])
+        for row, vacancy in zip(rows, vacancies):
+            vacancy['skills'] = skills[row.id]
+    return FastJSONResponse({'status': 'success', 'results': len(vacancies), 'vacancies': vacancies,
+                             'missing': [str(vacancy_id) for vacancy_id in missing]})
 
 
 @router.get('/{id}', response_model=schemas.VacancyResponse)
-def get_vacancy(id: str, db: Session = Depends(get_db)):
+def get_vacancy(id: uuid.UUID, request: Request, response: Response, db: Session = Depends(get_db)):
+    updated_at = db.execute(select(models.Vacancy.updated_at).where(models.Vacancy.id == id)).scalar()
+    if updated_at is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"No vacancy with this id: {id} found")
+    not_modified = conditional_response(request, response, make_etag('vacancy', id, updated_at), updated_at)
+    if not_modified is not None:
+        return not_modified
+
+    cache_key = cache.key('vacancy', id)
+    cached_vacancy = cache.get(cache_key)
+    if cached_vacancy is not None:
+        return cached_vacancy
+
     vacancy = db.query(models.Vacancy).filter(models.Vacancy.id == id).first()
     if not vacancy:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"No vacancy with this id: {id} found")
-    return vacancy
+    vacancy_response = jsonable_encoder(schemas.VacancyResponse.from_orm(vacancy))
+    cache.set(cache_key, vacancy_response)
+    return vacancy_response
+
+
+@router.get('/{id}/candidates', response_model=List[schemas.CandidateResponse])
+def get_candidates(id: uuid.UUID, db: Session = Depends(get_db), limit: int = Query(10, ge=1, le=MAX_LIMIT),
+                   page: int = Query(1, ge=1), cursor: Optional[str] = None):
+    if db.execute(select(models.Vacancy.id).where(models.Vacancy.id == id)).scalar() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"No vacancy with this id: {id} found")
+
+    after = decode_cursor(cursor, float, uuid.UUID) if cursor else None
+    candidates = rank_candidates(db, id, limit=limit, page=page, after=after)
+    next_cursor = ranked_cursor(candidates, limit)
+    return FastJSONResponse([{**row_dict(user), "score": score} for user, score in candidates],
+                            headers={'X-Next-Cursor': next_cursor} if next_cursor else {})
 
 
 @router.delete('/{id}')
-def delete_vacancy(id: str, db: Session = Depends(get_db)):
+def delete_vacancy(id: uuid.UUID, db: Session = Depends(get_db)):
     vacancy_query = db.query(models.Vacancy).filter(models.Vacancy.id == id)
     vacancy = vacancy_query.first()
     if not vacancy:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f'No vacancy with this id: {id} found')
 
+    vacancy_id = vacancy.id
     vacancy_query.delete(synchronize_session=False)
     db.commit()
+    skill_index.remove_vacancy(vacancy_id)
+    skill_snapshot.schedule_rebuild()
+    cache.invalidate('vacancy', vacancy_id)
+    cache.bump('recommend')
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -57,8 +150,8 @@ def vacancy_skills_match(vacancy_skills, user_skills, db):
             match_skills.append(vacancy_skill)
 
     if len(match_skills) > 0:
-        match_percent = vacancy_skills_qty * 100 / len(match_skills)
-        if match_percent >= 50:
+        match_percent = len(match_skills) * 100 / vacancy_skills_qty
+        if match_percent >= MATCH_THRESHOLD:
             return db.query(models.Vacancy).filter(models.Vacancy.id == match_skills[0].vacancy_id).one()
 
 
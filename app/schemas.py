@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 import uuid
 from pydantic import BaseModel
 
@@ -50,6 +50,7 @@ class ListSkillResponse(BaseModel):
     status: str
     results: int
     skills: List[SkillResponse]
+    next_cursor: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -75,7 +76,7 @@ class UpdateUserSchema(UserBase):
 
 
 class UserResponse(BaseModel):
-    id: int
+    id: uuid.UUID
     first_name: str
     last_name: str
     email: str
@@ -86,7 +87,7 @@ class UserResponse(BaseModel):
 
 
 class UpdateUserResponse(BaseModel):
-    id: int
+    id: uuid.UUID
     first_name: str
     last_name: str
     email: str
@@ -129,6 +130,73 @@ class VacancyResponse(BaseModel):
     company_name: str
     salary: float
     currency: str
+    salary_usd: Optional[float] = None
+
+    class Config:
+        orm_mode = True
+
+
+class ListVacancyResponse(BaseModel):
+    status: str
+    results: int
+    vacancies: List[VacancyResponse]
+    next_cursor: Optional[str] = None
+
+
+class UserSummaryResponse(BaseModel):
+    id: uuid.UUID
+    first_name: str
+    last_name: str
+    email: str
 
     class Config:
         orm_mode = True
+
+
+class ListUserResponse(BaseModel):
+    status: str
+    results: int
+    users: List[UserSummaryResponse]
+    next_cursor: Optional[str] = None
+
+
+class VacancyWithSkillsResponse(VacancyResponse):
+    skills: Optional[List[SkillBaseYear]] = None
+
+
+class BatchVacancyResponse(BaseModel):
+    status: str
+    results: int
+    vacancies: List[VacancyWithSkillsResponse]
+    missing: List[uuid.UUID]
+
+
+class UserWithSkillsResponse(UserSummaryResponse):
+    skills: Optional[List[SkillBaseYear]] = None
+
+
+class BatchUserResponse(BaseModel):
+    status: str
+    results: int
+    users: List[UserWithSkillsResponse]
+    missing: List[uuid.UUID]
+
+
+class BatchSkillResponse(BaseModel):
+    status: str
+    results: int
+    skills: List[SkillResponse]
+    missing: List[int]
+
+
+class RecommendedVacancyResponse(VacancyResponse):
+    score: float
+
+
+class CandidateResponse(UserSummaryResponse):
+    score: float
+
+
+class BatchRecommendSchema(BaseModel):
+    user_ids: Optional[List[uuid.UUID]] = None
+    limit: Optional[int] = None
@@ -0,0 +1,92 @@
+import argparse
+
+import uvicorn
+
+from .config import settings
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+
+def warm_up():
+    from sqlalchemy import text
+
+    from .change_feed import IN_FLIGHT_QUERY, WATERMARK_QUERY, change_feed
+    from .database import SessionLocal, get_engine
+    from .skill_catalog import skill_catalog
+    from .skill_index import skill_index
+
+    db = SessionLocal()
+    try:
+        # The watermark is read before the loads' snapshot. A change it missed
+        # either bumps the sequence afterwards or was still in flight then.
+        watermark = db.execute(text(WATERMARK_QUERY)).scalar()
+        db.commit()
+        db.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        in_flight = db.execute(text(IN_FLIGHT_QUERY)).scalar()
+        skill_catalog.load(db)
+        if settings.RECOMMENDER_ENGINE == 'index':
+            skill_index.load(db)
+        change_feed.watermark = None if in_flight else watermark
+    finally:
+        db.close()
+    # Forked workers must open their own connections.
+    get_engine().dispose()
+
+
+def load_app():
+    from .main import app
+
+    warm_up()
+    return app
+
+
+def gunicorn_options():
+    return {
+        'bind': f'{settings.WEB_HOST}:{settings.WEB_PORT}',
+        'workers': settings.WEB_WORKERS,
+        'worker_class': 'uvicorn.workers.UvicornWorker',
+        'preload_app': settings.WEB_PRELOAD,
+        'graceful_timeout': settings.WEB_GRACEFUL_TIMEOUT,
+        'max_requests': settings.WEB_MAX_REQUESTS,
+        'max_requests_jitter': settings.WEB_MAX_REQUESTS_JITTER,
+    }
+
+
+if BaseApplication is not None:
+    class Server(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            self.application = None
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            if self.application is None:
+                self.application = load_app()
+            return self.application
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with one or more worker processes")
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS)
+    parser.add_argument("--port", type=int, default=settings.WEB_PORT)
+    args = parser.parse_args(argv)
+    settings.WEB_WORKERS = args.workers
+    settings.WEB_PORT = args.port
+
+    if settings.WEB_WORKERS > 1:
+        if BaseApplication is None:
+            raise RuntimeError('WEB_WORKERS > 1 requires the gunicorn package')
+        Server(gunicorn_options()).run()
+    else:
+        uvicorn.run(load_app(), host=settings.WEB_HOST, port=settings.WEB_PORT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import bisect
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .change_feed import change_feed
+
+
+class SkillCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._generation = 0
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.loaded = False
+            self._loading = False
+            self._pending = []
+            self._keys = []
+            self._names = {}
+
+    def load(self, db: Session):
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._loading = True
+            self._pending = []
+        try:
+            rows = db.execute(select(models.Skill.id, models.Skill.name)).all()
+        except Exception:
+            with self._lock:
+                if generation == self._generation:
+                    self._loading = False
+                    self._pending = []
+            raise
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._names = dict(rows)
+            self._keys = sorted((name.lower(), skill_id) for skill_id, name in rows)
+            self.loaded = True
+            self._loading = False
+            for skill_id, name in self._pending:
+                self._put(skill_id, name)
+            self._pending = []
+
+    def ensure_loaded(self, db: Session):
+        if self.loaded:
+            return
+        with self._load_lock:
+            if not self.loaded:
+                self.load(db)
+
+    def put(self, skill_id, name):
+        with self._lock:
+            if self._loading:
+                self._pending.append((skill_id, name))
+            elif self.loaded:
+                self._put(skill_id, name)
+
+    def remove(self, skill_id):
+        self.put(skill_id, None)
+
+    def _put(self, skill_id, name):
+        previous = self._names.pop(skill_id, None)
+        if previous is not None:
+            idx = bisect.bisect_left(self._keys, (previous.lower(), skill_id))
+            if idx < len(self._keys) and self._keys[idx] == (previous.lower(), skill_id):
+                del self._keys[idx]
+        if name is not None:
+            self._names[skill_id] = name
+            bisect.insort(self._keys, (name.lower(), skill_id))
+
+    def complete(self, prefix, limit=10):
+        prefix = prefix.lower()
+        matches = []
+        with self._lock:
+            idx = bisect.bisect_left(self._keys, (prefix,))
+            while idx < len(self._keys) and len(matches) < limit:
+                key, skill_id = self._keys[idx]
+                if not key.startswith(prefix):
+                    break
+                matches.append((skill_id, self._names[skill_id]))
+                idx += 1
+        return matches
+
+
+skill_catalog = SkillCatalog()
+def update_on_change(change):
+    if change.row is None:
+        skill_catalog.clear()
+    else:
+        skill_catalog.put(change.row['id'], None if change.op == 'DELETE' else change.row['name'])
+
+
+change_feed.subscribe(('skills',), update_on_change)
+change_feed.on_resync(skill_catalog.clear)
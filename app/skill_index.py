@@ -0,0 +1,162 @@
+import bisect
+import threading
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .change_feed import change_feed
+
+
+class SkillIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._generation = 0
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.loaded = False
+            self._loading = False
+            self._pending = []
+            self._postings = {}
+            self._vacancy_skills = {}
+
+    def load(self, db: Session):
+        # A newer load or a clear() supersedes this one; its rows are discarded
+        # rather than written over the state the newer load and its writes built.
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._loading = True
+            self._pending = []
+        try:
+            rows = db.execute(
+                select(models.VacancySkill.skill_id, models.VacancySkill.vacancy_id, models.VacancySkill.years)
+                .order_by(models.VacancySkill.skill_id, models.VacancySkill.vacancy_id)
+            ).all()
+        except Exception:
+            with self._lock:
+                if generation == self._generation:
+                    self._loading = False
+                    self._pending = []
+            raise
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._postings = {}
+            self._vacancy_skills = {}
+            for skill_id, vacancy_id, years in rows:
+                self._postings.setdefault(skill_id, []).append((vacancy_id, years))
+                self._vacancy_skills.setdefault(vacancy_id, []).append(skill_id)
+            self.loaded = True
+            self._loading = False
+            for apply, args in self._pending:
+                apply(*args)
+            self._pending = []
+
+    def ensure_loaded(self, db: Session):
+        # Under AsyncSession.run_sync the load yields to the event loop mid-query,
+        # so a caller that blocked on the lock would stall the loop and the load
+        # with it. Callers that find a load in flight get False and answer without
+        # the index instead.
+        if self.loaded:
+            return True
+        if not self._load_lock.acquire(blocking=False):
+            return False
+        try:
+            if not self.loaded:
+                self.load(db)
+        finally:
+            self._load_lock.release()
+        return self.loaded
+
+    def _apply(self, apply, *args):
+        with self._lock:
+            if self._loading:
+                self._pending.append((apply, args))
+            elif self.loaded:
+                apply(*args)
+
+    def add_vacancy(self, vacancy_id, skills):
+        self._apply(self._add, vacancy_id, list(skills))
+
+    def remove_vacancy(self, vacancy_id):
+        self._apply(self._remove, vacancy_id)
+
+    def add_link(self, vacancy_id, skill_id, years):
+        self._apply(self._add_link, vacancy_id, skill_id, years)
+
+    def remove_link(self, vacancy_id, skill_id):
+        self._apply(self._remove_link, vacancy_id, skill_id)
+
+    def _add(self, vacancy_id, skills):
+        self._remove(vacancy_id)
+        for skill_id, years in skills:
+            bisect.insort(self._postings.setdefault(skill_id, []), (vacancy_id, years))
+        self._vacancy_skills[vacancy_id] = [skill_id for skill_id, _ in skills]
+
+    def _remove(self, vacancy_id):
+        for skill_id in self._vacancy_skills.pop(vacancy_id, []):
+            postings = self._postings[skill_id]
+            idx = bisect.bisect_left(postings, (vacancy_id,))
+            if idx < len(postings) and postings[idx][0] == vacancy_id:
+                del postings[idx]
+            if not postings:
+                del self._postings[skill_id]
+
+    def _add_link(self, vacancy_id, skill_id, years):
+        self._remove_link(vacancy_id, skill_id)
+        bisect.insort(self._postings.setdefault(skill_id, []), (vacancy_id, years))
+        self._vacancy_skills.setdefault(vacancy_id, []).append(skill_id)
+
+    def _remove_link(self, vacancy_id, skill_id):
+        skills = self._vacancy_skills.get(vacancy_id, [])
+        if skill_id not in skills:
+            return
+        skills.remove(skill_id)
+        if not skills:
+            del self._vacancy_skills[vacancy_id]
+        postings = self._postings[skill_id]
+        idx = bisect.bisect_left(postings, (vacancy_id,))
+        if idx < len(postings) and postings[idx][0] == vacancy_id:
+            del postings[idx]
+        if not postings:
+            del self._postings[skill_id]
+
+    def match(self, user_skills, threshold):
+        matched = {}
+        with self._lock:
+            for skill_id, user_years in user_skills.items():
+                for vacancy_id, years in self._postings.get(skill_id, ()):
+                    if user_years >= years:
+                        matched[vacancy_id] = matched.get(vacancy_id, 0) + 1
+
+            scores = {}
+            for vacancy_id, matched_qty in matched.items():
+                required = len(self._vacancy_skills[vacancy_id])
+                if matched_qty * 100 >= required * threshold:
+                    scores[vacancy_id] = matched_qty * 100.0 / required
+        return scores
+
+
+skill_index = SkillIndex()
+
+
+def update_on_change(change):
+    if change.row is None:
+        skill_index.clear()
+        return
+    vacancy_id = uuid.UUID(change.row['vacancy_id'])
+    if change.op == 'DELETE':
+        skill_index.remove_link(vacancy_id, change.row['skill_id'])
+    else:
+        skill_index.add_link(vacancy_id, change.row['skill_id'], change.row['years'])
+
+
+change_feed.subscribe(('vacancies_skills',), update_on_change)
+change_feed.on_resync(skill_index.clear)
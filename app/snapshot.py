@@ -0,0 +1,242 @@
+import argparse
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import metrics
+from .cache import cache
+from .change_feed import change_feed
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'HSKL'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sIQdIII4x')
+ALIGNMENT = 8
+
+
+def layout(vacancies_qty, skills_qty, postings_qty):
+    sections = (
+        ('vacancy_ids', np.uint8, vacancies_qty * 16),
+        ('required', np.int32, vacancies_qty),
+        ('skill_ids', np.int32, skills_qty),
+        ('skill_offsets', np.int64, skills_qty + 1),
+        ('posting_vacancies', np.int32, postings_qty),
+        ('posting_years', np.int32, postings_qty),
+    )
+    offset = HEADER.size
+    for name, dtype, count in sections:
+        offset += -offset % ALIGNMENT
+        yield name, dtype, count, offset
+        offset += np.dtype(dtype).itemsize * count
+
+
+def write_snapshot(path, matrices, version, built_at):
+    arrays = {
+        'vacancy_ids': np.frombuffer(b''.join(vacancy_id.bytes for vacancy_id in matrices.vacancy_ids),
+                                     dtype=np.uint8),
+        'required': matrices.required,
+        'skill_ids': np.asarray(matrices.skill_ids),
+        'skill_offsets': matrices.skill_offsets,
+        'posting_vacancies': matrices.posting_vacancies,
+        'posting_years': matrices.posting_years,
+    }
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as output:
+        output.write(HEADER.pack(MAGIC, FORMAT_VERSION, version, built_at, len(matrices.vacancy_ids),
+                                 len(matrices.skill_ids), len(matrices.posting_years)))
+        for name, dtype, count, offset in layout(len(matrices.vacancy_ids), len(matrices.skill_ids),
+                                                 len(matrices.posting_years)):
+            output.write(b'\0' * (offset - output.tell()))
+            output.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        output.flush()
+        os.fsync(output.fileno())
+    # Workers still reading the previous file keep their mapping of the old inode.
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, 'rb') as source:
+            stat = os.fstat(source.fileno())
+            if stat.st_size < HEADER.size:
+                raise ValueError(f'{path} is not a skill snapshot')
+            self._buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        magic, format_version, self.version, self.built_at, vacancies_qty, skills_qty, postings_qty = \
+            HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a skill snapshot')
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f'{path} has snapshot format {format_version}, expected {FORMAT_VERSION}')
+
+        for name, dtype, count, offset in layout(vacancies_qty, skills_qty, postings_qty):
+            if offset + np.dtype(dtype).itemsize * count > len(self._buffer):
+                raise ValueError(f'{path} is truncated')
+            setattr(self, name, np.frombuffer(self._buffer, dtype=dtype, count=count, offset=offset))
+        self.vacancy_ids = self.vacancy_ids.reshape(vacancies_qty, 16)
+
+    def __len__(self):
+        return len(self.required)
+
+    def match(self, user_skills, threshold):
+        candidates = []
+        for skill_id, user_years in user_skills.items():
+            position = int(np.searchsorted(self.skill_ids, skill_id))
+            if position == len(self.skill_ids) or self.skill_ids[position] != skill_id:
+                continue
+            start, end = self.skill_offsets[position], self.skill_offsets[position + 1]
+            candidates.append(self.posting_vacancies[start:end][self.posting_years[start:end] <= user_years])
+        if not candidates:
+            return {}
+
+        vacancies, matched = np.unique(np.concatenate(candidates), return_counts=True)
+        required = self.required[vacancies]
+        qualifies = matched * 100 >= required * threshold
+        return {uuid.UUID(bytes=self.vacancy_ids[idx].tobytes()): int(matched_qty) * 100.0 / int(required_qty)
+                for idx, matched_qty, required_qty in
+                zip(vacancies[qualifies], matched[qualifies], required[qualifies])}
+
+
+class SnapshotStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.snapshot = None
+        self._path = None
+        self._checked_at = 0.0
+        self._rebuild = None
+        self._requested_at = None
+
+    def current(self):
+        path = settings.SNAPSHOT_PATH
+        snapshot = self.snapshot
+        if snapshot is not None and path == self._path and \
+                time.monotonic() - self._checked_at < settings.SNAPSHOT_CHECK_INTERVAL:
+            return snapshot
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            if stat is None:
+                self.snapshot = None
+            else:
+                identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                if self.snapshot is None or path != self._path or self.snapshot.identity != identity:
+                    self.snapshot = Snapshot(path)
+                    self._path = path
+                    cache.bump('recommend')
+                return self.snapshot
+        self.schedule_rebuild()
+        return None
+
+    def schedule_rebuild(self):
+        if settings.RECOMMENDER_ENGINE != 'snapshot':
+            return
+        with self._lock:
+            # A pending rebuild absorbs this request, but must not skip as fresh
+            # a snapshot built before the change that made it.
+            self._requested_at = time.time()
+            if self._rebuild is not None:
+                return
+            self._rebuild = threading.Timer(settings.SNAPSHOT_REBUILD_DELAY, self._run_rebuild,
+                                            args=(settings.SNAPSHOT_PATH,))
+            self._rebuild.daemon = True
+            self._rebuild.start()
+
+    def _run_rebuild(self, path):
+        from .database import SessionLocal
+
+        with self._lock:
+            requested_at, self._rebuild = self._requested_at, None
+        db = SessionLocal()
+        try:
+            publish_snapshot(db, path, requested_at)
+        except Exception:
+            logger.exception('skill snapshot rebuild failed')
+        finally:
+            db.close()
+
+    def clear(self):
+        with self._lock:
+            if self._rebuild is not None:
+                self._rebuild.cancel()
+                self._rebuild = None
+            self.snapshot = None
+            self._path = None
+
+
+skill_snapshot = SnapshotStore()
+
+metrics.Gauge('skill_snapshot_version', 'Version of the skill snapshot mapped by this process', [],
+              collect=lambda: [({}, skill_snapshot.snapshot.version)] if skill_snapshot.snapshot else [])
+
+
+def build_snapshot(db: Session, path):
+    from .batch import SkillMatrices
+
+    try:
+        version = Snapshot(path).version + 1
+    except (OSError, ValueError):
+        version = 1
+    built_at = time.time()
+    matrices = SkillMatrices.load(db, user_ids=[])
+    write_snapshot(path, matrices, version, built_at)
+    return version, matrices
+
+
+def publish_snapshot(db: Session, path, requested_at=None):
+    # Every worker hears the same change; the first to take the lock rebuilds
+    # and the rest skip once a snapshot read after their request is in place.
+    with open(f'{path}.lock', 'a') as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            if requested_at is not None:
+                try:
+                    if Snapshot(path).built_at >= requested_at:
+                        return None
+                except (OSError, ValueError):
+                    pass
+            return build_snapshot(db, path)
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def rebuild_on_change(change):
+    skill_snapshot.schedule_rebuild()
+
+
+change_feed.subscribe(('vacancies', 'vacancies_skills'), rebuild_on_change)
+change_feed.on_resync(skill_snapshot.schedule_rebuild)
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Publish a memory-mapped snapshot of vacancy skill postings")
+    parser.add_argument("--path", default=None, help="defaults to SNAPSHOT_PATH")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        version, matrices = publish_snapshot(db, args.path or settings.SNAPSHOT_PATH)
+    finally:
+        db.close()
+    print(f"version={version} vacancies={len(matrices.vacancy_ids)} skills={len(matrices.skill_ids)} "
+          f"postings={len(matrices.posting_years)}")
+
+
+if __name__ == "__main__":
+    main()
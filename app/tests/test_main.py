@@ -1,20 +1,45 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
 
-from app import models
+from app import models, schemas
+from .. import responses, snapshot
+from ..cache import CACHE_REQUESTS, MemoryCache, RedisCache, cache
+from ..change_feed import BULK_ROWS, Change, change_feed
 from ..config import settings
-from ..database import Base, get_db
+from ..currency import set_rate
+from ..database import Base, database_url, get_async_db, get_db, get_engine
+from ..importer import MAX_BATCH_SIZE
+from ..instrumentation import instrument_engine
+from ..recommender import rebuild_matches, refresh_user_matches, refresh_vacancy_matches
+from ..server import warm_up
+from ..skill_catalog import skill_catalog
+from ..skill_index import skill_index
+from ..snapshot import Snapshot, build_snapshot, skill_snapshot
 from ..main import app
 
 SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}" \
                           f"@{settings.POSTGRES_HOSTNAME}:{settings.DATABASE_PORT}/{settings.POSTGRES_DB}"
+ASYNC_SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
 
 
 @pytest.fixture(scope="session")
 def db_engine():
     engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    instrument_engine(engine)
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
     yield engine
@@ -22,19 +47,33 @@ def db_engine():
 
 @pytest.fixture(scope="function")
 def db(db_engine):
-    connection = db_engine.connect()
-    transaction = connection.begin()
-
-    db = Session(bind=connection)
+    db = Session(bind=db_engine)
     yield db
 
-    db.rollback()
-    connection.close()
+    db.close()
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    with db_engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+
+
+@pytest.fixture(scope="session")
+def async_db_engine():
+    async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+    instrument_engine(async_engine.sync_engine)
+    yield async_engine
 
 
 @pytest.fixture(scope="function")
-def client(db):
+def client(db, async_db_engine):
+    async_engine = async_db_engine
+
+    async def get_test_async_db():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_db:
+            yield async_db
+
     app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_async_db] = get_test_async_db
+    cache.clear()
 
     with TestClient(app) as c:
         yield c
@@ -188,4 +227,1016 @@ def test_get_user(client, create_skill, create_user):
 def test_get_user_not_found(client, create_skill, create_user):
     response = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9912")
 
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+@pytest.fixture
+def create_vacancies_ranked(db):
+    vacancies = [
+        ("Django Dev", [(1, 1), (2, 1)]),
+        ("Cloud Dev", [(1, 5), (2, 10), (3, 1)]),
+    ]
+
+    for position_name, skills in vacancies:
+        new_vacancy = models.Vacancy(position_name=position_name, company_name="HUNTY",
+                                     salary=1000, currency="USD")
+        db.add(new_vacancy)
+        db.commit()
+        db.refresh(new_vacancy)
+
+        for skill_id, years in skills:
+            db.add(models.VacancySkill(vacancy_id=new_vacancy.id, skill_id=skill_id, years=years))
+        db.commit()
+
+
+def test_get_recommend_ranked(client, create_skill, create_user, create_vacancy, create_vacancies_ranked):
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+
+    assert response.status_code == 200
+    assert [data['position_name'] for data in response.json()] == ["Django Dev", "Python Dev"]
+    assert response.json()[0]['score'] == 100
+
+
+def test_get_recommend_paged(client, create_skill, create_user, create_vacancy, create_vacancies_ranked):
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911?limit=1&page=2")
+
+    assert response.status_code == 200
+    assert [data['position_name'] for data in response.json()] == ["Python Dev"]
+
+
+@pytest.fixture
+def index_engine(monkeypatch):
+    monkeypatch.setattr(settings, "RECOMMENDER_ENGINE", "index")
+    skill_index.clear()
+    yield skill_index
+    skill_index.clear()
+
+
+def test_get_recommend_indexed(client, index_engine, create_skill, create_user, create_vacancy,
+                               create_vacancies_ranked):
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+
+    assert response.status_code == 200
+    assert [data['position_name'] for data in response.json()] == ["Django Dev", "Python Dev"]
+
+
+def test_skill_index_concurrent_first_loads_do_not_block(index_engine):
+    from sqlalchemy.util import await_only, greenlet_spawn
+
+    class AwaitingSession:
+        def execute(self, statement):
+            await_only(asyncio.sleep(0.05))
+            return type("Result", (), {"all": lambda self: [(1, uuid.uuid4(), 2)]})()
+
+    async def load_concurrently():
+        return await asyncio.wait_for(asyncio.gather(
+            greenlet_spawn(index_engine.ensure_loaded, AwaitingSession()),
+            greenlet_spawn(index_engine.ensure_loaded, AwaitingSession()),
+        ), 5)
+
+    assert asyncio.run(load_concurrently()) == [True, False]
+    assert index_engine.loaded
+
+
+def test_get_recommend_index_concurrent_cold_requests(index_engine, async_db_engine, db, create_skill, create_user,
+                                                      create_vacancy, create_vacancies_ranked):
+    from ..recommender import recommend_vacancies
+
+    user_id = uuid.UUID("942db60d-eef8-469c-954a-67b62d8b9911")
+
+    async def recommend():
+        async with AsyncSession(async_db_engine) as async_db:
+            return [vacancy.position_name for vacancy, _ in
+                    await async_db.run_sync(recommend_vacancies, user_id)]
+
+    async def recommend_concurrently():
+        return await asyncio.wait_for(asyncio.gather(*(recommend() for _ in range(4))), 10)
+
+    results = asyncio.run(recommend_concurrently())
+    assert all(sorted(result) == ["Django Dev", "Python Dev"] for result in results)
+    assert index_engine.loaded
+
+
+def test_skill_index_incremental(client, index_engine, create_skill, create_user):
+    client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert index_engine.loaded
+
+    response = client.post("api/vacancies/vacancy", json={
+        "position_name": "Backend Dev", "company_name": "HUNTY", "salary": 1000, "currency": "USD",
+        "skills": [{"id": 1, "name": "python", "years": 2}]
+    })
+    assert response.status_code == 201
+
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert [data['position_name'] for data in response.json()] == ["Backend Dev"]
+
+    client.delete(f"api/vacancies/{response.json()[0]['id']}")
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert response.json() == []
+
+
+def test_get_recommend_batch(client, create_skill, create_user, create_vacancy, create_vacancies_ranked):
+    response = client.post("api/users/recommender/batch", json={})
+
+    assert response.status_code == 200
+    results = {data["user_id"]: data["vacancies"] for data in map(json.loads, response.text.splitlines())}
+    expected = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911").json()
+    assert [data["id"] for data in results["942db60d-eef8-469c-954a-67b62d8b9911"]] == \
+           [data["id"] for data in expected]
+
+
+def test_get_recommend_batch_observed_after_body(client, create_skill, create_user, create_vacancy,
+                                                create_vacancies_ranked):
+    route = 'method="POST",route="/api/users/recommender/batch"'
+
+    def sample(name):
+        for line in client.get("metrics").text.splitlines():
+            if line.startswith(f"{name}{{{route}}} "):
+                return float(line.split()[-1])
+        return 0.0
+
+    statements = sample("http_request_statements_sum")
+    response = client.post("api/users/recommender/batch", json={})
+
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+    assert sample("http_request_statements_sum") > statements
+    assert sample("http_request_serialization_seconds_count") == 0
+
+
+@pytest.fixture
+def table_engine(monkeypatch):
+    monkeypatch.setattr(settings, "RECOMMENDER_ENGINE", "table")
+
+
+def test_get_recommend_materialized(client, db, table_engine, create_skill, create_user, create_vacancy,
+                                    create_vacancies_ranked):
+    # The fixtures write rows directly, as data predating the table would be.
+    assert rebuild_matches(db) == 2
+    db.commit()
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert [data['position_name'] for data in response.json()] == ["Django Dev", "Python Dev"]
+
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911?refresh=true")
+    assert [data['position_name'] for data in response.json()] == ["Django Dev", "Python Dev"]
+
+    client.post("api/vacancies/vacancy", json={
+        "position_name": "Backend Dev", "company_name": "HUNTY", "salary": 1000, "currency": "USD",
+        "skills": [{"id": 1, "name": "python", "years": 2}]
+    })
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert sorted(data['position_name'] for data in response.json()) == ["Backend Dev", "Django Dev", "Python Dev"]
+
+    backend_dev = next(data for data in response.json() if data['position_name'] == "Backend Dev")
+    client.delete(f"api/vacancies/{backend_dev['id']}")
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert [data['position_name'] for data in response.json()] == ["Django Dev", "Python Dev"]
+
+
+def test_concurrent_refreshes_keep_the_new_pair(db_engine, db, create_skill):
+    user_id, vacancy_id = uuid.uuid4(), uuid.uuid4()
+    user_db, vacancy_db = Session(bind=db_engine), Session(bind=db_engine)
+    try:
+        user_db.add(models.User(id=user_id, first_name="ana", last_name="perez", email="ana@gmail.com",
+                                years_prev_exp=3))
+        user_db.flush()
+        user_db.add(models.UserSkill(user_id=user_id, skill_id=1, years=3))
+        user_db.flush()
+        refresh_user_matches(user_db, user_id)
+
+        vacancy_db.add(models.Vacancy(id=vacancy_id, position_name="Backend Dev", company_name="HUNTY", salary=1,
+                                      currency="USD"))
+        vacancy_db.flush()
+        vacancy_db.add(models.VacancySkill(vacancy_id=vacancy_id, skill_id=1, years=2))
+        vacancy_db.flush()
+        refresh = threading.Thread(target=lambda: (refresh_vacancy_matches(vacancy_db, vacancy_id),
+                                                   vacancy_db.commit()))
+        refresh.start()
+        time.sleep(0.2)
+        user_db.commit()
+        refresh.join(5)
+    finally:
+        user_db.close()
+        vacancy_db.close()
+
+    assert db.query(models.UserVacancyMatch).filter(models.UserVacancyMatch.user_id == user_id).count() == 1
+
+
+def test_register_user(client, db, create_skill):
+    response = client.post("api/users/register/user", json={
+        "first_name": "dani", "last_name": "filth", "email": "df@gmail.com", "years_prev_exp": 3,
+        "skills": [{"id": 1, "name": "python", "years": 3}, {"id": 3, "name": "aws", "years": 1}]
+    })
+    assert response.status_code == 201
+
+    user = db.query(models.User).filter(models.User.email == "df@gmail.com").one()
+    response = client.get(f"api/users/{user.id}")
+    assert sorted((data["name"], data["years"]) for data in response.json()["skills"]) == [("aws", 1), ("python", 3)]
+
+
+def test_bulk_register_vacancies(client, db, create_skill):
+    lines = [
+        {"position_name": "Python Dev", "company_name": "HUNTY", "salary": 1000, "currency": "USD",
+         "skills": [{"id": 1, "name": "python", "years": 2}]},
+        {"position_name": "Broken Dev", "company_name": "HUNTY"},
+        {"position_name": "Rust Dev", "company_name": "HUNTY", "salary": 1000, "currency": "USD",
+         "skills": [{"id": 99, "name": "rust", "years": 2}]},
+        {"position_name": "Cloud Dev", "company_name": "HUNTY", "salary": 2000, "currency": "USD",
+         "skills": [{"id": 1, "name": "python", "years": 1}, {"id": 3, "name": "aws", "years": 1}]},
+    ]
+    response = client.post("api/vacancies/bulk?batch_size=2", data="\n".join(map(json.dumps, lines)),
+                           headers={"content-type": "application/x-ndjson"})
+
+    assert response.status_code == 201
+    assert response.json()["processed"] == 4
+    assert response.json()["inserted"] == 2
+    assert [error["line"] for error in response.json()["errors"]] == [2, 3]
+    assert db.query(models.VacancySkill).count() == 3
+
+
+@pytest.mark.parametrize("url", ["api/users/bulk", "api/vacancies/bulk"])
+@pytest.mark.parametrize("batch_size", [0, MAX_BATCH_SIZE + 1])
+def test_bulk_register_rejects_out_of_range_batch_size(client, url, batch_size):
+    response = client.post(url, params={"batch_size": batch_size}, data="")
+
+    assert response.status_code == 422
+
+
+def test_bulk_register_users_csv(client, db, create_skill, create_user):
+    body = "\n".join([
+        "first_name,last_name,email,years_prev_exp,skills",
+        'ana,perez,ana@gmail.com,3,"[{""id"": 1, ""name"": ""python"", ""years"": 3}]"',
+        "dani,filth,DF@gmail.com,1,[]",
+    ])
+    response = client.post("api/users/bulk", data=body, headers={"content-type": "text/csv"})
+
+    assert response.status_code == 201
+    assert response.json()["inserted"] == 1
+    assert response.json()["errors"][0]["line"] == 3
+    assert db.query(models.UserSkill).count() == 3
+
+
+def test_bulk_register_users_csv_quoted_newline(client, db, create_skill):
+    body = "\n".join([
+        "first_name,last_name,email,years_prev_exp,skills",
+        '"ana\nmaria",perez,ana@gmail.com,3,"[{""id"": 1,',
+        '""name"": ""python"", ""years"": 3}]"',
+        ",filth,df@gmail.com,1,[]",
+        "broken,row,br@gmail.com,3,[",
+    ])
+    response = client.post("api/users/bulk", data=body, headers={"content-type": "text/csv"})
+
+    assert response.status_code == 201
+    assert response.json()["inserted"] == 2
+    assert [error["line"] for error in response.json()["errors"]] == [6]
+    assert db.query(models.User).filter(models.User.email == "ana@gmail.com").one().first_name == "ana\nmaria"
+    assert db.query(models.User).filter(models.User.email == "df@gmail.com").one().first_name == ""
+
+
+def test_bulk_register_users_reports_database_errors(client, db, create_skill):
+    lines = [
+        {"first_name": "ana", "last_name": "perez", "email": "ana@gmail.com", "years_prev_exp": 3, "skills": []},
+        {"first_name": "dani", "last_name": "filth", "email": "df@gmail.com", "years_prev_exp": 10 ** 12,
+         "skills": []},
+        {"first_name": "rick", "last_name": "owens", "email": "ro@gmail.com", "years_prev_exp": 1,
+         "skills": [{"id": 99, "name": "rust", "years": 2}]},
+    ]
+    response = client.post("api/users/bulk", data="\n".join(map(json.dumps, lines)),
+                           headers={"content-type": "application/x-ndjson"})
+
+    assert response.status_code == 201
+    assert response.json()["processed"] == 3
+    assert response.json()["inserted"] == 1
+    assert response.json()["failed"] == 2
+    assert [(error["line"], error["errors"][0]["type"]) for error in response.json()["errors"]] == [
+        (2, "value_error.database"), (3, "value_error")]
+    assert db.query(models.User).filter(models.User.email == "ana@gmail.com").count() == 1
+
+
+def test_get_metrics(client, create_skill, create_user):
+    get_engine().connect().close()
+    client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911")
+    response = client.get("metrics")
+
+    assert response.status_code == 200
+    assert 'db_pool_checked_out{engine="sync"}' in response.text
+    assert 'db_pool_checkout_wait_seconds_count{engine="sync"}' in response.text
+
+
+def test_get_skills_search(client, db, create_skill):
+    db.add(models.Skill(id=4, name="Django REST"))
+    db.commit()
+    response = client.get("api/skills/?search=DJ")
+
+    assert response.status_code == 200
+    assert [data["name"] for data in response.json()["skills"]] == ["django", "Django REST"]
+
+
+def test_get_skills_cursor(client, create_skill):
+    response = client.get("api/skills/?limit=2")
+    assert [data["name"] for data in response.json()["skills"]] == ["python", "django"]
+
+    response = client.get(f"api/skills/?limit=2&cursor={response.json()['next_cursor']}")
+    assert [data["name"] for data in response.json()["skills"]] == ["aws"]
+    assert response.json()["next_cursor"] is None
+
+
+def test_get_vacancies_cursor(client, create_skill, create_vacancy, create_vacancies_ranked):
+    seen = []
+    cursor = ""
+    while cursor is not None:
+        response = client.get(f"api/vacancies/?limit=2&cursor={cursor}")
+        assert response.status_code == 200
+        seen.extend(data["position_name"] for data in response.json()["vacancies"])
+        cursor = response.json()["next_cursor"]
+
+    assert sorted(seen) == ["Cloud Dev", "Django Dev", "Python Dev"]
+
+
+@pytest.fixture
+def catalog():
+    skill_catalog.clear()
+    yield skill_catalog
+    skill_catalog.clear()
+
+
+def test_autocomplete_skills(client, catalog, create_skill):
+    response = client.get("api/skills/autocomplete?q=DJ")
+    assert [data["name"] for data in response.json()["skills"]] == ["django"]
+    assert catalog.loaded
+
+    client.put("api/skills/3", json={"name": "Django Channels"})
+    response = client.get("api/skills/autocomplete?q=dj")
+    assert [data["name"] for data in response.json()["skills"]] == ["django", "Django Channels"]
+
+    client.delete("api/skills/2")
+    response = client.get("api/skills/autocomplete?q=dj&limit=1")
+    assert [data["name"] for data in response.json()["skills"]] == ["Django Channels"]
+
+
+def test_skill_catalog_discards_superseded_load(catalog):
+    started, release = threading.Event(), threading.Event()
+
+    class SlowSession:
+        def execute(self, statement):
+            started.set()
+            release.wait(5)
+            return type("Result", (), {"all": lambda self: [(1, "python")]})()
+
+    class FastSession:
+        def execute(self, statement):
+            return type("Result", (), {"all": lambda self: [(1, "python"), (2, "django")]})()
+
+    slow = threading.Thread(target=catalog.load, args=(SlowSession(),))
+    slow.start()
+    started.wait(5)
+    catalog.load(FastSession())
+    catalog.put(3, "docker")
+    release.set()
+    slow.join(5)
+
+    assert [name for _, name in catalog.complete("")] == ["django", "docker", "python"]
+
+
+def test_get_user_single_query(client, db_engine, create_skill, create_user):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine, "before_cursor_execute", count)
+    try:
+        response = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911")
+    finally:
+        event.remove(db_engine, "before_cursor_execute", count)
+
+    assert response.json()["id"] == "942db60d-eef8-469c-954a-67b62d8b9911"
+    assert response.json()["skills"] == [{"id": 1, "name": "python", "years": 5},
+                                         {"id": 2, "name": "django", "years": 5}]
+    assert len(statements) == 1
+
+
+def test_get_skill_cached(client, db, create_skill):
+    hits = CACHE_REQUESTS.value(backend=cache.name, result="hit")
+    assert client.get("api/skills/1").json()["name"] == "python"
+    assert client.get("api/skills/1").json()["name"] == "python"
+    assert CACHE_REQUESTS.value(backend=cache.name, result="hit") == hits + 1
+
+    client.put("api/skills/1", json={"name": "python3"})
+    assert client.get("api/skills/1").json()["name"] == "python3"
+
+
+def test_get_recommend_cache_invalidated(client, create_skill, create_user, create_vacancy):
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert [data["position_name"] for data in response.json()] == ["Python Dev"]
+
+    client.delete(f"api/vacancies/{response.json()[0]['id']}")
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert response.json() == []
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+
+    def scan_iter(self, pattern):
+        return [key for key in list(self.data) if key.startswith(pattern.rstrip("*"))]
+
+
+def test_redis_cache_generations():
+    redis_cache = RedisCache(FakeRedis())
+    key = redis_cache.key("recommend", "user", scope="user")
+    redis_cache.set(key, [{"id": 1}])
+    assert redis_cache.get(key) == [{"id": 1}]
+
+    redis_cache.bump("recommend", scope="user")
+    assert redis_cache.get(redis_cache.key("recommend", "user", scope="user")) is None
+
+
+def test_memory_cache_generations_are_bounded():
+    memory_cache = MemoryCache(max_entries=2)
+    stale_key = memory_cache.key("recommend", "page", scope="a")
+    memory_cache.set(stale_key, ["stale"])
+    memory_cache.bump("recommend", scope="a")
+
+    for scope in "bcd":
+        memory_cache.bump("recommend", scope=scope)
+    assert len(memory_cache._generations) == 2
+    assert memory_cache.get(memory_cache.key("recommend", "page", scope="a")) is None
+
+
+def test_get_skill_not_modified(client, create_skill):
+    response = client.get("api/skills/1")
+    etag = response.headers["etag"]
+    assert response.headers["last-modified"]
+
+    response = client.get("api/skills/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    client.put("api/skills/1", json={"name": "python3"})
+    response = client.get("api/skills/1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_get_user_not_modified(client, create_skill, create_user):
+    response = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911")
+    etag = response.headers["etag"]
+
+    response = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    client.put("api/skills/2", json={"name": "django4"})
+    response = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["skills"][1]["name"] == "django4"
+
+
+def test_get_user_etag_tracks_removed_links(client, db, create_skill, create_user):
+    etag = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911").headers["etag"]
+    client.delete("api/skills/1")
+
+    response = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [skill["name"] for skill in response.json()["skills"]] == ["django"]
+
+
+def test_get_user_ignores_if_modified_since(client, db, create_skill, create_user):
+    response = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert "last-modified" not in response.headers
+    client.delete("api/skills/1")
+
+    response = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911",
+                          headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert response.status_code == 200
+    assert [skill["name"] for skill in response.json()["skills"]] == ["django"]
+
+
+def test_update_user_touches_updated_at(client, db, create_skill, create_user):
+    etag = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911").headers["etag"]
+    client.put("api/users/942db60d-eef8-469c-954a-67b62d8b9911", json={
+        "first_name": "dani", "last_name": "filth", "email": "df@gmail.com", "years_prev_exp": 11})
+
+    response = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert db.query(models.User).one().updated_at > db.query(models.User).one().created_at
+
+
+def test_get_recommend_cursor(client, create_skill, create_user, create_vacancy, create_vacancies_ranked):
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911?limit=1")
+    assert [data['position_name'] for data in response.json()] == ["Django Dev"]
+
+    cursor = response.headers["x-next-cursor"]
+    response = client.get(f"api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911?limit=1&cursor={cursor}")
+    assert [data['position_name'] for data in response.json()] == ["Python Dev"]
+
+    cursor = response.headers["x-next-cursor"]
+    response = client.get(f"api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911?limit=1&cursor={cursor}")
+    assert response.json() == []
+    assert "x-next-cursor" not in response.headers
+
+
+def test_get_recommend_ndjson(client, index_engine, create_skill, create_user, create_vacancy,
+                              create_vacancies_ranked):
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911?format=ndjson&limit=1")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["position_name"] for line in response.text.splitlines()] == ["Django Dev"]
+
+    cursor = response.headers["x-next-cursor"]
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911"
+                          f"?format=ndjson&cursor={cursor}")
+    assert [json.loads(line)["position_name"] for line in response.text.splitlines()] == ["Python Dev"]
+
+
+@pytest.mark.parametrize("url", ["api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911", "api/skills/",
+                                 "api/users/", "api/vacancies/",
+                                 "api/vacancies/942db60d-eef8-469c-954a-67b62d8b9911/candidates"])
+@pytest.mark.parametrize("query", ["limit=0", "limit=-1", "limit=101", "page=0", "page=-1"])
+def test_paging_rejects_out_of_range_values(client, url, query):
+    response = client.get(f"{url}?{query}")
+    assert response.status_code == 422
+
+
+def test_fast_listings_match_schemas(client, db, create_skill, create_user, create_vacancy):
+    listings = [
+        ("api/skills/", schemas.ListSkillResponse, models.Skill, "skills", schemas.SkillResponse),
+        ("api/vacancies/", schemas.ListVacancyResponse, models.Vacancy, "vacancies", schemas.VacancyResponse),
+        ("api/users/", schemas.ListUserResponse, models.User, "users", schemas.UserSummaryResponse),
+    ]
+    for url, list_schema, model, field, item_schema in listings:
+        payload = client.get(url).json()
+        orm_items = db.execute(select(model).order_by(model.id)).scalars().all()
+        assert payload == jsonable_encoder(list_schema.parse_obj(payload))
+        assert payload[field] == [jsonable_encoder(item_schema.from_orm(item)) for item in orm_items]
+
+    recommendations = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911").json()
+    vacancy = db.query(models.Vacancy).one()
+    assert recommendations == [{**jsonable_encoder(schemas.VacancyResponse.from_orm(vacancy)), "score": 200 / 3}]
+
+
+def test_fast_json_response_without_orjson(monkeypatch):
+    row = {"id": uuid.UUID("942db60d-eef8-469c-954a-67b62d8b9911"), "salary": 1.5}
+    expected = responses.FastJSONResponse(row).body
+    monkeypatch.setattr(responses, "orjson", None)
+    assert json.loads(responses.FastJSONResponse(row).body) == json.loads(expected)
+
+
+def test_datagen_is_seeded(db):
+    from benchmarks.datagen import DataGenerator, truncate
+
+    first = DataGenerator(skills=20, users=50, vacancies=30, seed=7).load(db)
+    first_users = db.execute(select(models.User.id).order_by(models.User.id)).scalars().all()
+    truncate(db)
+    second = DataGenerator(skills=20, users=50, vacancies=30, seed=7).load(db)
+    db.commit()
+
+    assert first == second
+    assert db.execute(select(models.User.id).order_by(models.User.id)).scalars().all() == first_users
+    assert db.query(models.Vacancy).count() == 30
+
+
+def test_datagen_fills_derived_columns(db, monkeypatch):
+    from benchmarks.datagen import DataGenerator
+
+    monkeypatch.setattr(settings, "RECOMMENDER_ENGINE", "table")
+    for currency, rate in (("USD", 1.0), ("COP", 0.00025), ("EUR", 1.08), ("MXN", 0.058)):
+        set_rate(db, currency, rate)
+    DataGenerator(skills=20, users=50, vacancies=30, seed=7).load(db)
+    db.commit()
+
+    assert db.query(models.Vacancy).filter(models.Vacancy.salary_usd.is_(None)).count() == 0
+    assert db.query(models.UserVacancyMatch).count() > 0
+
+
+def test_load_compare_flags_errors():
+    from benchmarks.load import compare
+
+    result = {"rps": 100.0, "p50_ms": 1.0, "p95_ms": 2.0, "p99_ms": 3.0, "errors": 0}
+    assert compare({"users.get": result}, {"users.get": result}, 0.2) == []
+    assert compare({"users.get": {**result, "errors": 3}}, {"users.get": result}, 0.2) == ["users.get: 3 errors"]
+    assert compare({"users.list": {**result, "errors": 1}}, {}, 0.2) == ["users.list: 1 errors"]
+
+
+def test_server_timing(client, create_skill, create_user):
+    response = client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911")
+
+    timings = dict(part.split(";", 1) for part in response.headers["server-timing"].split(", "))
+    assert set(timings) == {"db", "pool", "serialize", "total"}
+    assert 'desc="1 statements"' in timings["db"]
+
+    metrics_body = client.get("metrics").text
+    assert 'http_request_statements_bucket{method="GET",route="/api/users/{id}",le="1"}' in metrics_body
+
+
+def test_slow_query_log(client, monkeypatch, caplog, create_skill, create_user):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0.001)
+    with caplog.at_level("WARNING", logger="app.slow_query"):
+        client.get("api/users/942db60d-eef8-469c-954a-67b62d8b9911")
+
+    assert any("on /api/users/{id}: SELECT" in record.getMessage() for record in caplog.records)
+
+
+def test_delete_skill_cascades(client, db, create_skill, create_user, create_vacancy):
+    assert client.delete("api/skills/1").status_code == 204
+
+    assert db.query(models.UserSkill).filter(models.UserSkill.skill_id == 1).count() == 0
+    assert db.query(models.VacancySkill).filter(models.VacancySkill.skill_id == 1).count() == 0
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert [data["score"] for data in response.json()] == [50.0]
+
+
+def test_register_user_email_case_insensitive(client, create_skill, create_user):
+    payload = {"first_name": "Ana", "last_name": "Gomez", "email": "DF@gmail.com", "years_prev_exp": 1,
+               "skills": []}
+    assert client.post("api/users/register/user", json=payload).status_code == 409
+
+
+def explain(connection, statement, parameters):
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute("EXPLAIN " + statement, parameters)
+        return "\n".join(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+@pytest.mark.parametrize("engine_name", ["sql", "index", "table"])
+def test_router_queries_use_indexes(client, db_engine, async_db_engine, monkeypatch, engine_name, create_skill,
+                                    create_user, create_vacancy, create_vacancies_ranked):
+    monkeypatch.setattr(settings, "RECOMMENDER_ENGINE", engine_name)
+    skill_index.clear()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE", "WITH"):
+            statements.append((statement, parameters))
+
+    user_id = "942db60d-eef8-469c-954a-67b62d8b9911"
+    event.listen(db_engine, "before_cursor_execute", capture)
+    event.listen(async_db_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        client.post("api/users/register/user", json={"first_name": "Ana", "last_name": "Gomez",
+                                                     "email": "ana@gmail.com", "years_prev_exp": 1,
+                                                     "skills": [{"id": 1, "name": "python", "years": 3}]})
+        client.get(f"api/users/{user_id}")
+        client.put(f"api/users/{user_id}", json={"first_name": "Test", "last_name": "User",
+                                                 "email": "df@gmail.com", "years_prev_exp": 5})
+        vacancies = client.get(f"api/users/user/recommender/{user_id}?refresh=true").json()
+        client.get("api/users/?limit=1")
+        client.get("api/vacancies/?limit=1")
+        client.get(f"api/vacancies/{vacancies[0]['id']}")
+        client.get(f"api/vacancies/{vacancies[0]['id']}/candidates")
+        client.get("api/vacancies/batch", params={"ids": [vacancy["id"] for vacancy in vacancies],
+                                                   "include": "skills"})
+        client.get("api/users/batch", params={"ids": [user_id], "include": "skills"})
+        client.get("api/skills/batch", params={"ids": [1, 2]})
+        client.get(f"api/users/user/recommender/{user_id}?min_salary=100&currency=usd&sort=salary")
+        client.get("api/vacancies/?limit=1&min_salary=100&sort=salary")
+        client.get("api/vacancies/?limit=1&currency=usd")
+        client.get("api/skills/?search=py")
+        client.get("api/skills/1")
+        client.put("api/skills/3", json={"name": "gcp"})
+        client.delete(f"api/vacancies/{vacancies[0]['id']}")
+        client.delete("api/skills/3")
+    finally:
+        event.remove(db_engine, "before_cursor_execute", capture)
+        event.remove(async_db_engine.sync_engine, "before_cursor_execute", capture)
+
+    plans = []
+    with db_engine.connect() as connection:
+        connection.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in statements:
+            plan = explain(connection, statement, parameters)
+            assert "Seq Scan" not in plan, f"{statement}\n{plan}"
+            plans.append(plan)
+        connection.exec_driver_sql("RESET enable_seqscan")
+
+    assert any("ix_users_skills_user_id" in plan for plan in plans)
+    assert any("ux_users_email_lower" in plan for plan in plans)
+    assert any("ix_vacancies_skills_vacancy_id" in plan or "user_vacancy_matches_vacancy_id" in plan
+               for plan in plans)
+
+
+@pytest.fixture
+def change_feed_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "CHANGE_FEED", True)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_change_feed_updates_derived_state(change_feed_enabled, index_engine, catalog, client, db, create_skill,
+                                           create_user):
+    user_url = "api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911"
+    assert client.get(user_url).json() == []
+    client.get("api/skills/autocomplete?q=dja")
+    assert wait_for(lambda: change_feed.listening is not None and change_feed.listening.is_set())
+
+    vacancy_id = uuid.uuid4()
+    db.add(models.Vacancy(id=vacancy_id, position_name="Backend Dev", company_name="HUNTY", salary=1,
+                          currency="USD"))
+    db.flush()
+    db.add_all([models.VacancySkill(vacancy_id=vacancy_id, skill_id=1, years=2),
+                models.VacancySkill(vacancy_id=vacancy_id, skill_id=2, years=6)])
+    db.add(models.Skill(id=4, name="docker"))
+    db.commit()
+
+    assert wait_for(lambda: [data["score"] for data in client.get(user_url).json()] == [50.0])
+    assert wait_for(lambda: client.get("api/skills/autocomplete?q=doc").json()["results"] == 1)
+
+    db.query(models.VacancySkill).filter(models.VacancySkill.skill_id == 2).delete()
+    db.commit()
+    assert wait_for(lambda: [data["score"] for data in client.get(user_url).json()] == [100.0])
+
+
+def test_change_feed_coalesces_bulk_statements(monkeypatch, change_feed_enabled, index_engine, client, db,
+                                               create_skill, create_user):
+    user_url = "api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911"
+    assert client.get(user_url).json() == []
+    assert wait_for(lambda: change_feed.listening is not None and change_feed.listening.is_set())
+    assert skill_index.loaded
+    changes = []
+    monkeypatch.setitem(change_feed._subscribers, "vacancies_skills",
+                        change_feed._subscribers["vacancies_skills"] + [changes.append])
+
+    vacancy_ids = [uuid.uuid4() for _ in range(BULK_ROWS + 1)]
+    db.execute(models.Vacancy.__table__.insert().values(
+        [dict(id=vacancy_id, position_name="Backend Dev", company_name="HUNTY", salary=1, currency="USD")
+         for vacancy_id in vacancy_ids]))
+    db.execute(models.VacancySkill.__table__.insert().values(
+        [dict(vacancy_id=vacancy_id, skill_id=1, years=2) for vacancy_id in vacancy_ids]))
+    db.commit()
+
+    assert wait_for(lambda: not skill_index.loaded)
+    assert changes == [Change("vacancies_skills", "INSERT", None)]
+    assert len(client.get(user_url).json()) == 10
+
+
+def test_change_feed_drops_state_loaded_before_listening(index_engine, client, db, create_skill, create_user):
+    skill_index.load(db)
+    vacancy_id = uuid.uuid4()
+    db.add(models.Vacancy(id=vacancy_id, position_name="Backend Dev", company_name="HUNTY", salary=1,
+                          currency="USD"))
+    db.flush()
+    db.add(models.VacancySkill(vacancy_id=vacancy_id, skill_id=1, years=2))
+    db.commit()
+    assert skill_index.match({1: 5}, 50) == {}
+
+    listen_once()
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert [data["position_name"] for data in response.json()] == ["Backend Dev"]
+
+
+def listen_once():
+    async def listen():
+        change_feed.start(database_url())
+        try:
+            await asyncio.wait_for(change_feed.listening.wait(), 5)
+        finally:
+            await change_feed.stop()
+
+    asyncio.run(listen())
+
+
+def test_change_feed_keeps_preloaded_state(index_engine, catalog, client, db, create_skill, create_user):
+    warm_up()
+    assert change_feed.watermark is not None
+
+    listen_once()
+    assert skill_index.loaded and skill_catalog.loaded
+    assert change_feed.watermark is None
+
+
+def test_change_feed_resyncs_state_changed_after_preload(index_engine, client, db, create_skill, create_user):
+    warm_up()
+    vacancy_id = uuid.uuid4()
+    db.add(models.Vacancy(id=vacancy_id, position_name="Backend Dev", company_name="HUNTY", salary=1,
+                          currency="USD"))
+    db.flush()
+    db.add(models.VacancySkill(vacancy_id=vacancy_id, skill_id=1, years=2))
+    db.commit()
+
+    listen_once()
+    assert not skill_index.loaded
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911")
+    assert [data["position_name"] for data in response.json()] == ["Backend Dev"]
+
+
+@pytest.fixture
+def create_candidates(db):
+    senior = models.User(id="942db60d-eef8-469c-954a-67b62d8b9913", first_name="ana", last_name="senior",
+                         email="senior@gmail.com", years_prev_exp=8)
+    junior = models.User(id="942db60d-eef8-469c-954a-67b62d8b9914", first_name="leo", last_name="junior",
+                         email="junior@gmail.com", years_prev_exp=1)
+    db.add_all([senior, junior])
+    db.flush()
+    db.add_all([models.UserSkill(user_id=senior.id, skill_id=skill_id, years=6) for skill_id in (1, 2, 3)] +
+               [models.UserSkill(user_id=junior.id, skill_id=1, years=6)])
+    db.commit()
+
+
+@pytest.mark.parametrize("engine_name", ["sql", "table"])
+def test_get_candidates(client, db, monkeypatch, engine_name, create_skill, create_user, create_vacancy,
+                        create_candidates):
+    monkeypatch.setattr(settings, "RECOMMENDER_ENGINE", engine_name)
+    vacancy = db.query(models.Vacancy).one()
+    if engine_name == "table":
+        refresh_vacancy_matches(db, vacancy.id)
+        db.commit()
+
+    response = client.get(f"api/vacancies/{vacancy.id}/candidates?limit=1")
+    assert response.status_code == 200
+    assert [(data["last_name"], data["score"]) for data in response.json()] == [("senior", 100.0)]
+
+    response = client.get(f"api/vacancies/{vacancy.id}/candidates?limit=1&cursor={response.headers['x-next-cursor']}")
+    assert [(data["email"], data["score"]) for data in response.json()] == [("df@gmail.com", 200 / 3)]
+
+
+def test_get_candidates_not_found(client):
+    response = client.get(f"api/vacancies/{uuid.uuid4()}/candidates")
+    assert response.status_code == 404
+
+
+@pytest.fixture
+def currency_rates(db):
+    set_rate(db, "USD", 1.0)
+    set_rate(db, "COP", 0.00025)
+    db.commit()
+
+
+@pytest.mark.parametrize("engine_name", ["sql", "index", "table", "snapshot"])
+def test_get_recommend_salary_filters(client, db, monkeypatch, tmp_path, engine_name, create_skill, create_user,
+                                      create_vacancy, create_vacancies_ranked, currency_rates):
+    monkeypatch.setattr(settings, "RECOMMENDER_ENGINE", engine_name)
+    monkeypatch.setattr(settings, "SNAPSHOT_PATH", str(tmp_path / "skills.snapshot"))
+    skill_index.clear()
+    skill_snapshot.clear()
+    if engine_name == "snapshot":
+        build_snapshot(db, settings.SNAPSHOT_PATH)
+    url = "api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911?refresh=true"
+
+    response = client.get(f"{url}&min_salary=2000")
+    assert [data["position_name"] for data in response.json()] == ["Python Dev"]
+    assert response.json()[0]["salary_usd"] == pytest.approx(2499.99975)
+
+    response = client.get(f"{url}&currency=usd")
+    assert [data["position_name"] for data in response.json()] == ["Django Dev"]
+
+    response = client.get(f"{url}&sort=salary&limit=1")
+    assert [data["position_name"] for data in response.json()] == ["Python Dev"]
+    response = client.get(f"{url}&sort=salary&limit=1&cursor={response.headers['X-Next-Cursor']}")
+    assert [data["position_name"] for data in response.json()] == ["Django Dev"]
+
+
+def test_vacancies_salary_normalized(client, db, create_skill, currency_rates):
+    client.post("api/vacancies/vacancy", json={
+        "position_name": "Backend Dev", "company_name": "HUNTY", "salary": 8000000, "currency": "cop",
+        "skills": [{"id": 1, "name": "python", "years": 2}]
+    })
+    client.post("api/vacancies/bulk", data=json.dumps({
+        "position_name": "Cloud Dev", "company_name": "HUNTY", "salary": 1500, "currency": "USD", "skills": []
+    }), headers={"content-type": "application/x-ndjson"})
+    client.post("api/vacancies/bulk", data=json.dumps({
+        "position_name": "Rust Dev", "company_name": "HUNTY", "salary": 900, "currency": "EUR", "skills": []
+    }), headers={"content-type": "application/x-ndjson"})
+
+    salaries = dict(db.execute(select(models.Vacancy.position_name, models.Vacancy.salary_usd)).all())
+    assert salaries == {"Backend Dev": 2000, "Cloud Dev": 1500, "Rust Dev": None}
+
+    response = client.get("api/vacancies/?sort=salary&limit=1")
+    assert [data["position_name"] for data in response.json()["vacancies"]] == ["Backend Dev"]
+    response = client.get(f"api/vacancies/?sort=salary&limit=1&cursor={response.json()['next_cursor']}")
+    assert [data["position_name"] for data in response.json()["vacancies"]] == ["Cloud Dev"]
+
+    response = client.get("api/vacancies/?min_salary=1800")
+    assert [data["position_name"] for data in response.json()["vacancies"]] == ["Backend Dev"]
+
+    set_rate(db, "EUR", 1.1)
+    db.commit()
+    salary_usd = db.execute(select(models.Vacancy.salary_usd).where(models.Vacancy.currency == "EUR")).scalar()
+    assert salary_usd == pytest.approx(990)
+
+
+def test_import_has_no_database_side_effects():
+    env = {name: value for name, value in os.environ.items()
+           if not name.startswith("POSTGRES_") and name not in ("DATABASE_PORT", "CLIENT_ORIGIN")}
+    result = subprocess.run([sys.executable, "-c", "import app.main, app.models, app.server, app.cache"], env=env,
+                            cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    assert result.returncode == 0, result.stderr.decode()
+
+
+def test_get_batch_by_ids(client, db, db_engine, create_skill, create_user, create_vacancy,
+                          create_vacancies_ranked):
+    vacancy_ids = {name: str(vacancy_id) for vacancy_id, name in
+                   db.execute(select(models.Vacancy.id, models.Vacancy.position_name)).all()}
+    missing_id = "942db60d-eef8-469c-954a-67b62d8b9999"
+    ids = [vacancy_ids["Cloud Dev"], missing_id, vacancy_ids["Python Dev"], vacancy_ids["Cloud Dev"]]
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine, "before_cursor_execute", count)
+    try:
+        response = client.get("api/vacancies/batch", params={"ids": ids, "include": "skills"})
+    finally:
+        event.remove(db_engine, "before_cursor_execute", count)
+
+    assert response.status_code == 200
+    assert [data["position_name"] for data in response.json()["vacancies"]] == ["Cloud Dev", "Python Dev"]
+    assert [skill["name"] for skill in response.json()["vacancies"][1]["skills"]] == ["python", "django", "aws"]
+    assert response.json()["missing"] == [missing_id]
+    assert len(statements) == 2
+    assert all("ANY" in statement for statement in statements)
+
+    response = client.get("api/users/batch", params={"ids": [missing_id, "942db60d-eef8-469c-954a-67b62d8b9911"]})
+    assert [data["first_name"] for data in response.json()["users"]] == ["dani"]
+    assert "skills" not in response.json()["users"][0]
+    assert response.json()["missing"] == [missing_id]
+
+    response = client.get("api/skills/batch", params={"ids": [3, 7, 1]})
+    assert [data["name"] for data in response.json()["skills"]] == ["aws", "python"]
+    assert response.json()["missing"] == [7]
+
+
+def test_get_batch_too_many_ids(client, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_IDS", 2)
+    response = client.get("api/skills/batch", params={"ids": [1, 2, 3]})
+
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def snapshot_engine(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "RECOMMENDER_ENGINE", "snapshot")
+    monkeypatch.setattr(settings, "SNAPSHOT_PATH", str(tmp_path / "skills.snapshot"))
+    monkeypatch.setattr(settings, "SNAPSHOT_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(settings, "SNAPSHOT_REBUILD_DELAY", 0.05)
+    skill_snapshot.clear()
+    yield settings.SNAPSHOT_PATH
+    skill_snapshot.clear()
+
+
+def test_get_recommend_snapshot(client, db, snapshot_engine, create_skill, create_user, create_vacancy,
+                                create_vacancies_ranked):
+    url = "api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911"
+    sql_response = client.get(url).json()
+    assert wait_for(lambda: skill_snapshot.current() is not None)
+    first = skill_snapshot.current()
+    assert first.version == 1
+    assert client.get(f"{url}?limit=5").json() == sql_response
+
+    client.post("api/vacancies/vacancy", json={
+        "position_name": "Backend Dev", "company_name": "HUNTY", "salary": 1000, "currency": "USD",
+        "skills": [{"id": 1, "name": "python", "years": 2}]
+    })
+    assert wait_for(lambda: sorted(data["position_name"] for data in client.get(url).json()) ==
+                    ["Backend Dev", "Django Dev", "Python Dev"])
+    assert skill_snapshot.current().version > first.version
+    assert len(first) == 3
+
+
+def test_get_recommend_snapshot_skips_deleted_vacancies(client, db, snapshot_engine, create_skill, create_user,
+                                                        create_vacancy, create_vacancies_ranked):
+    build_snapshot(db, snapshot_engine)
+    db.query(models.Vacancy).filter(models.Vacancy.position_name == "Django Dev").delete()
+    db.commit()
+
+    response = client.get("api/users/user/recommender/942db60d-eef8-469c-954a-67b62d8b9911?limit=1")
+    assert [data["position_name"] for data in response.json()] == ["Python Dev"]
+    assert len(skill_snapshot.current()) == 3
+
+
+def test_snapshot_rejects_foreign_files(tmp_path):
+    path = tmp_path / "skills.snapshot"
+    path.write_bytes(b"not a snapshot" * 4)
+    with pytest.raises(ValueError):
+        Snapshot(str(path))
+
+    path.write_bytes(snapshot.HEADER.pack(snapshot.MAGIC, snapshot.FORMAT_VERSION + 1, 1, 0.0, 0, 0, 0))
+    with pytest.raises(ValueError):
+        Snapshot(str(path))
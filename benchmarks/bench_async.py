@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from app import models
+from app.database import AsyncSessionLocal, SessionLocal, get_async_engine
+from app.recommender import recommend_vacancies
+
+
+async def sync_request(user_id, limit):
+    db = SessionLocal()
+    try:
+        recommend_vacancies(db, user_id, limit=limit)
+    finally:
+        db.close()
+
+
+async def async_request(user_id, limit):
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(recommend_vacancies, user_id, limit)
+
+
+async def measure(handler, user_ids, concurrency, limit):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(user_id):
+        async with semaphore:
+            await handler(user_id, limit)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(user_id) for user_id in user_ids))
+    return len(user_ids) / (time.perf_counter() - started)
+
+
+async def run_benchmark(args):
+    db = SessionLocal()
+    try:
+        user_ids = db.execute(select(models.User.id).limit(args.requests)).scalars().all()
+    finally:
+        db.close()
+    user_ids = (user_ids * (args.requests // max(len(user_ids), 1) + 1))[:args.requests]
+
+    sync_rps = await measure(sync_request, user_ids, args.concurrency, args.limit)
+    async_rps = await measure(async_request, user_ids, args.concurrency, args.limit)
+    await get_async_engine().dispose()
+
+    print(f"sync session on the event loop: {sync_rps:.1f} req/s")
+    print(f"async session:                  {async_rps:.1f} req/s (concurrency {args.concurrency})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recommendation throughput with sync vs async sessions")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10)
+    asyncio.get_event_loop().run_until_complete(run_benchmark(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
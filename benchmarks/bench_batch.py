@@ -0,0 +1,39 @@
+import argparse
+import time
+
+from sqlalchemy import select
+
+from app import models
+from app.batch import SkillMatrices
+from app.database import SessionLocal
+from app.recommender import recommend_vacancies_sql
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch scoring vs per-request recommendation throughput")
+    parser.add_argument("--sample", type=int, default=200, help="users scored through the per-request path")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        user_ids = db.execute(select(models.User.id).limit(args.sample)).scalars().all()
+
+        started = time.perf_counter()
+        for user_id in user_ids:
+            recommend_vacancies_sql(db, user_id, limit=args.limit)
+        per_request = len(user_ids) / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        matrices = SkillMatrices.load(db)
+        users_qty = sum(1 for _ in matrices.iter_recommendations(limit=args.limit))
+        batch = users_qty / (time.perf_counter() - started)
+    finally:
+        db.close()
+
+    print(f"per-request: {len(user_ids)} users, {per_request:.1f} users/s")
+    print(f"batch:       {users_qty} users, {batch:.1f} users/s (including matrix load)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import random
+import timeit
+from types import SimpleNamespace
+
+from app.routers.vacancy import match_skill, vacancy_skills_match
+
+
+class NoQuery:
+    # vacancy_skills_match only touches the session to load a matching
+    # vacancy; answering with None keeps the timing on the matching loop.
+    def query(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def one(self):
+        return None
+
+
+def make_skills(rng, qty, skill_pool, owner):
+    return [SimpleNamespace(skill_id=skill_id, years=rng.randint(0, 8), **owner)
+            for skill_id in rng.sample(skill_pool, qty)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of match_skill and vacancy_skills_match")
+    parser.add_argument("--user-skills", type=int, nargs="+", default=[3, 10, 30])
+    parser.add_argument("--vacancy-skills", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    skill_pool = list(range(1, 101))
+    db = NoQuery()
+    for user_skills_qty in args.user_skills:
+        user_skills = make_skills(rng, user_skills_qty, skill_pool, {"user_id": None})
+        vacancy_skills = make_skills(rng, args.vacancy_skills, skill_pool, {"vacancy_id": None})
+
+        per_skill = timeit.timeit(lambda: match_skill(vacancy_skills[0], user_skills), number=args.number)
+        per_vacancy = timeit.timeit(lambda: vacancy_skills_match(vacancy_skills, user_skills, db),
+                                    number=args.number)
+        print(f"{user_skills_qty:>3} user skills: match_skill {per_skill / args.number * 1e6:.2f} us, "
+              f"vacancy_skills_match ({args.vacancy_skills} skills) {per_vacancy / args.number * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
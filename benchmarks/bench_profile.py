@@ -0,0 +1,59 @@
+import argparse
+import time
+import uuid
+
+from fastapi import Request, Response
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.cache import cache
+from app.database import get_engine
+from app.routers.user import get_user
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Statements and latency of get_user by number of skills")
+    parser.add_argument("--skills", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    statements = []
+    engine = get_engine()
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection)
+    event.listen(engine, "before_cursor_execute", lambda *params: statements.append(params[2]))
+    try:
+        first_skill_id = (db.execute(select(func.max(models.Skill.id))).scalar() or 0) + 1
+        db.add_all([models.Skill(id=first_skill_id + idx, name=f"bench-skill-{idx}")
+                    for idx in range(max(args.skills))])
+        db.flush()
+
+        for skills_qty in args.skills:
+            user = models.User(id=uuid.uuid4(), first_name="bench", last_name="user",
+                               email=f"{uuid.uuid4()}@bench.local", years_prev_exp=1)
+            db.add(user)
+            db.flush()
+            db.add_all([models.UserSkill(user_id=user.id, skill_id=first_skill_id + idx, years=1)
+                        for idx in range(skills_qty)])
+            db.flush()
+            db.expunge_all()
+
+            statements.clear()
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                cache.clear()
+                get_user(user.id, Request({"type": "http", "headers": []}), Response(), db)
+                db.expunge_all()
+            elapsed = (time.perf_counter() - started) / args.repeat
+            print(f"{skills_qty:>4} skills: {len(statements) / args.repeat:.0f} statements/read, "
+                  f"{elapsed * 1000:.2f} ms/read")
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import time
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.database import get_engine
+from app.recommender import VACANCY_COLUMNS
+from app.responses import FastJSONResponse, row_dict
+
+
+def orm_path(db, limit):
+    vacancies = db.execute(select(models.Vacancy).limit(limit)).scalars().all()
+    return JSONResponse(jsonable_encoder(schemas.ListVacancyResponse(
+        status='success', results=len(vacancies), vacancies=[schemas.VacancyResponse.from_orm(vacancy)
+                                                             for vacancy in vacancies])
+    )).body
+
+
+def fast_path(db, limit):
+    vacancies = db.execute(select(*VACANCY_COLUMNS).limit(limit)).all()
+    return FastJSONResponse({'status': 'success', 'results': len(vacancies),
+                             'vacancies': [row_dict(vacancy) for vacancy in vacancies]}).body
+
+
+def measure(path, db, limit, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        path(db, limit)
+        db.expunge_all()
+    return repeat * limit / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Listing serialization throughput: orm_mode vs tuple rows")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    engine = get_engine()
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection)
+    try:
+        db.add_all([models.Vacancy(id=uuid.uuid4(), position_name=f"bench-{idx}", company_name="bench",
+                                   salary=1000 + idx, currency="USD") for idx in range(max(args.rows))])
+        db.flush()
+        db.expunge_all()
+
+        for limit in args.rows:
+            orm_rps = measure(orm_path, db, limit, args.repeat)
+            fast_rps = measure(fast_path, db, limit, args.repeat)
+            print(f"{limit:>5} rows: orm_mode {orm_rps:>10.0f} rows/s, "
+                  f"fast path {fast_rps:>10.0f} rows/s ({fast_rps / orm_rps:.1f}x)")
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_APP = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+FIRST_REQUEST = """
+import time
+started = time.perf_counter()
+import app.main
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    client.get('/api/healthchecker')
+print(time.perf_counter() - started)
+"""
+
+
+def run(code, repeat):
+    process_times, import_times = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, check=True).stdout
+        process_times.append(time.perf_counter() - started)
+        import_times.append(float(output.decode().split()[-1]))
+    return process_times, import_times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold start of a worker: interpreter, app import and first request")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    for name, code in (("import app.main", IMPORT_APP), ("startup + first request", FIRST_REQUEST)):
+        process_times, import_times = run(code, args.repeat)
+        print(f"{name:<24} in-process p50 {statistics.median(import_times) * 1000:7.1f} ms, "
+              f"process p50 {statistics.median(process_times) * 1000:7.1f} ms, "
+              f"max {max(process_times) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
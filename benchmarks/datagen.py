@@ -0,0 +1,95 @@
+import argparse
+import random
+import uuid
+
+from sqlalchemy import func, select, text
+
+from app import models
+from app.currency import currency_code, usd_rates
+from app.database import Base, SessionLocal
+from app.importer import copy_rows
+from app.recommender import materialized_matches_enabled, rebuild_matches
+
+CURRENCIES = ["USD", "COP", "EUR", "MXN"]
+
+
+class DataGenerator:
+    def __init__(self, skills=200, users=10000, vacancies=5000, seed=42, skew=1.1):
+        self.skills = skills
+        self.users = users
+        self.vacancies = vacancies
+        self.seed = seed
+        self.random = random.Random(seed)
+        # A few skills (python, sql, ...) are far more common than the long tail.
+        self.weights = [1 / (rank + 1) ** skew for rank in range(skills)]
+
+    def pick_skills(self, skill_ids, low, high):
+        qty = self.random.randint(low, min(high, len(skill_ids)))
+        picked = set()
+        while len(picked) < qty:
+            picked.update(self.random.choices(skill_ids, weights=self.weights, k=qty - len(picked)))
+        return sorted(picked)
+
+    def load(self, db):
+        first_skill_id = (db.execute(select(func.max(models.Skill.id))).scalar() or 0) + 1
+        skill_ids = list(range(first_skill_id, first_skill_id + self.skills))
+        copy_rows(db, 'skills', ['id', 'name'], [(skill_id, f"skill-{skill_id}") for skill_id in skill_ids])
+        db.execute(text("SELECT setval(pg_get_serial_sequence('skills', 'id'), :value)"),
+                   {"value": skill_ids[-1]})
+
+        users, user_skills = [], []
+        for idx in range(self.users):
+            user_id = uuid.UUID(int=self.random.getrandbits(128))
+            users.append((user_id, f"first-{idx}", f"last-{idx}", f"user-{self.seed}-{idx}@bench.local",
+                          self.random.randint(0, 15)))
+            user_skills.extend((skill_id, user_id, self.random.randint(0, 10))
+                               for skill_id in self.pick_skills(skill_ids, 1, 8))
+        copy_rows(db, 'users', ['id', 'first_name', 'last_name', 'email', 'years_prev_exp'], users)
+        copy_rows(db, 'users_skills', ['skill_id', 'user_id', 'years'], user_skills)
+
+        rates = usd_rates(db)
+        vacancies, vacancy_skills = [], []
+        for idx in range(self.vacancies):
+            vacancy_id = uuid.UUID(int=self.random.getrandbits(128))
+            salary, currency = self.random.randint(1000, 10000), self.random.choice(CURRENCIES)
+            rate = rates.get(currency_code(currency))
+            vacancies.append((vacancy_id, f"position-{idx}", f"company-{idx % 500}", salary, currency,
+                              None if rate is None else salary * rate))
+            vacancy_skills.extend((skill_id, vacancy_id, self.random.randint(1, 6))
+                                  for skill_id in self.pick_skills(skill_ids, 2, 6))
+        copy_rows(db, 'vacancies', ['id', 'position_name', 'company_name', 'salary', 'currency', 'salary_usd'],
+                  vacancies)
+        copy_rows(db, 'vacancies_skills', ['skill_id', 'vacancy_id', 'years'], vacancy_skills)
+        if materialized_matches_enabled():
+            rebuild_matches(db)
+        return {"skills": self.skills, "users": len(users), "user_skills": len(user_skills),
+                "vacancies": len(vacancies), "vacancy_skills": len(vacancy_skills)}
+
+
+def truncate(db):
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    db.execute(text(f"TRUNCATE {tables} CASCADE"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load a seeded synthetic dataset through COPY")
+    parser.add_argument("--skills", type=int, default=200)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--vacancies", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="empty every table first")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.truncate:
+            truncate(db)
+        counts = DataGenerator(args.skills, args.users, args.vacancies, args.seed).load(db)
+        db.commit()
+    finally:
+        db.close()
+    print(" ".join(f"{name}={qty}" for name, qty in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
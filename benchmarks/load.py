@@ -0,0 +1,135 @@
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASELINE = "benchmarks/baseline.json"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1)]
+
+
+def discover(base_url):
+    users = requests.get(f"{base_url}/api/users/", params={"limit": 100}).json()["users"]
+    vacancies = requests.get(f"{base_url}/api/vacancies/", params={"limit": 100}).json()["vacancies"]
+    skills = requests.get(f"{base_url}/api/skills/", params={"limit": 100}).json()["skills"]
+    if not (users and vacancies and skills):
+        raise SystemExit("no data to drive; run python -m benchmarks.datagen first")
+    return ([user["id"] for user in users], [vacancy["id"] for vacancy in vacancies],
+            [skill["id"] for skill in skills], [skill["name"] for skill in skills])
+
+
+def scenarios(base_url):
+    user_ids, vacancy_ids, skill_ids, skill_names = discover(base_url)
+    return {
+        "skills.list": lambda rng: f"{base_url}/api/skills/?limit=20",
+        "skills.autocomplete": lambda rng: f"{base_url}/api/skills/autocomplete?q={rng.choice(skill_names)[:7]}",
+        "skills.get": lambda rng: f"{base_url}/api/skills/{rng.choice(skill_ids)}",
+        "vacancies.list": lambda rng: f"{base_url}/api/vacancies/?limit=20",
+        "vacancies.get": lambda rng: f"{base_url}/api/vacancies/{rng.choice(vacancy_ids)}",
+        "users.list": lambda rng: f"{base_url}/api/users/?limit=20",
+        "users.get": lambda rng: f"{base_url}/api/users/{rng.choice(user_ids)}",
+        "users.recommend": lambda rng: f"{base_url}/api/users/user/recommender/{rng.choice(user_ids)}",
+    }
+
+
+def drive(make_url, requests_qty, concurrency, seed):
+    local = threading.local()
+    latencies, errors = [], []
+
+    def call(idx):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        url = make_url(random.Random(seed + idx))
+        started = time.perf_counter()
+        response = local.session.get(url)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(call, range(requests_qty)))
+    elapsed = time.perf_counter() - started
+    return {
+        "rps": round(requests_qty / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "errors": len(errors),
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if result["errors"] > (reference or {}).get("errors", 0):
+            regressions.append(f"{name}: {result['errors']} errors")
+        if reference is None:
+            continue
+        if result["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms vs {reference['p95_ms']} ms")
+        if result["rps"] < reference["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['rps']} req/s vs {reference['rps']} req/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load driver for every router")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="+", help="scenario names to run")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'scenario':<22}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name, make_url in scenarios(args.url.rstrip("/")).items():
+        if args.only and name not in args.only:
+            continue
+        result = results[name] = drive(make_url, args.requests, args.concurrency, args.seed)
+        print(f"{name:<22}{result['rps']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+              f"{result['p99_ms']:>9}{result['errors']:>8}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump({"commit": current_commit(), **results}, baseline_file, indent=2, sort_keys=True)
+        return
+
+    try:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        print(f"no baseline at {args.baseline}; use --save-baseline to record one")
+        return
+    print(f"comparing with the baseline recorded at commit {baseline.get('commit', 'unknown')}")
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()